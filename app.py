@@ -4,59 +4,179 @@ Scott Fehrman, scott.fehrman@sailpoint.com
 """
 
 import streamlit as st
+import numpy as np
 import pandas as pd
+import utilities.constants as CONSTANTS
 from streamlit.components.v1 import html
-from pyvis.network import Network
-from typing import List
-from utilities.charts import get_scatter, get_heatmap, get_scatter_3d, get_pie
-from utilities.maps import get_pydeck_map
-from utilities.graphs import get_reportsto
+from typing import Callable, List
+from utilities.charts import get_scatter, get_heatmap, get_scatter_3d, get_pie, get_bar, get_histogram
+from utilities.maps import get_pydeck_map, MAP_MODES
+from utilities.graphs import get_reportsto, get_reportsto_deck, get_reportsto_tree, get_reportsto_summary, get_access_cooccurrence, get_access_peers
+from utilities.clusters import GraphSummary, CLUSTER_MODES
+from utilities.hierarchy import OrgHierarchy, OrgTreeView
+from utilities.store import IdentityStore
+from utilities.analytics import OrgAnalytics, DIRECT_REPORTS, DEPTH, HEADCOUNT
 from utilities.sptk import sptk_service
-from sailpoint.paginator import Paginator
+from utilities.snapshot import IdentitySnapshot
+from utilities.frames import get_identity_frame
+from utilities.tables import TableSource, NormalizedSource, render_table, table_cache
+from utilities.cache import stage_cache
+from utilities.tracing import Trace, trace_run, span
+from utilities.collector import AsyncCollector, get_access_frame, join_access, ENTITLEMENTS
+from utilities.mesh import AccessMesh, get_peer_groups, ACCESS_KEY, OUTLIER_SCORE
+from utilities.aggregates import IdentityCube
+from utilities.artifacts import ArtifactStore
+from utilities.filters import FilterIndex, IdentityFilter, get_filtered_cube, render_filters
 from sailpoint.v2025.api.identities_api import IdentitiesApi
 from sailpoint.v2025.models.identity import Identity
 
+LARGE_GRAPH_NODES: int = 2000 # above this the pyvis physics simulation stalls the browser
+WORKER_MAX_AGE: float = 180.0 # seconds without a worker heartbeat before the app refreshes on its own
+
 def main():
     st.set_page_config(page_title="Developer Days",page_icon="🚀",layout="wide")
     st.title("Developer Days 2025")
 
-    identities_api: IdentitiesApi = sptk_service.get_identities_api()
+    # --- Diagnostics (optional stage tracing) ---
+
+    if not st.sidebar.checkbox("Diagnostics"):
+        dashboard()
+        return
 
+    memory = st.sidebar.checkbox("Trace memory (slower)", value=True)
+    with trace_run(memory=memory) as trace:
+        if memory and not trace.memory:
+            st.sidebar.caption("Another session is tracing memory, this run records timings only")
+        with span("dashboard"):
+            dashboard()
+    render_diagnostics(trace)
+
+def dashboard():
     # --- Get all the identities ---
 
-    identities: List[Identity] = Paginator.paginate(identities_api.list_identities, 10000)
+    snapshot: IdentitySnapshot = IdentitySnapshot(tenant=str(getattr(sptk_service.config, "base_url", "default")))
+
+    # a running precompute worker (worker.py) keeps the snapshot fresh and publishes the stages
+    artifacts: ArtifactStore = ArtifactStore()
+    worker_live: bool = artifacts.is_live(WORKER_MAX_AGE)
+    if st.sidebar.button("Reload identities"):
+        if worker_live: # the worker owns the snapshot, it reloads and publishes a new version
+            artifacts.request_refresh()
+            st.sidebar.caption("Reload requested from the worker")
+        else:
+            snapshot.invalidate()
+    if worker_live:
+        st.sidebar.caption(f"Precomputed by the worker, version {artifacts.current() or 'pending'}")
+
+    if not worker_live and not snapshot.is_fresh():
+        identities_api: IdentitiesApi = sptk_service.get_identities_api()
+        progress = st.empty()
+        snapshot.refresh(
+            identities_api.list_identities,
+            on_page=lambda count: progress.caption(f"Loading identities ... {count:,}"),
+            search_api=sptk_service.get_search_api(),
+            workers=8,
+            max_results=10000)
+        progress.empty()
+
+    # every stage below is computed once per dataset version and shared by all sessions,
+    # or loaded from the artifact store when the worker has published the version
+    version: str = (worker_live and artifacts.current()) or snapshot.version()
+    read_identities: Callable[[], List[Identity]] = snapshot.read # not cached, only the frame and the store are kept
     # st.header("Identities (objects)")
     # st.write(identities)
 
-    # --- load into a dictionary (JSON) ---
+    # --- Create a DataFrame (only the columns the dashboards use) ---
+
+    all_df: pd.DataFrame = artifacts.get_or_compute("frame", version, lambda: get_identity_frame(read_identities()))
 
-    identities_dict = [identity.to_dict() for identity in identities]
-    # st.header("Identities Dictionary (JSON)")
-    # st.json(identities_dict)
+    # compact array backed copy used by the map and graph builders
+    all_store: IdentityStore = artifacts.get_or_compute("store", version, lambda: IdentityStore.from_frame(all_df))
+    all_hierarchy: OrgHierarchy = artifacts.get_or_compute("hierarchy", version, lambda: OrgHierarchy.from_frame(all_df))
+    all_cube: IdentityCube = artifacts.get_or_compute("cube", version, lambda: IdentityCube(all_df, CONSTANTS.DEPARTMENT, CONSTANTS.LOCATION), CONSTANTS.DEPARTMENT, CONSTANTS.LOCATION)
 
-    # --- Create a DataFrame ---
+    # --- Filters (boolean masks over the frame, the filtered stages are cached per selection) ---
+
+    index: FilterIndex = stage_cache.get_or_compute("filter_index", version, lambda: FilterIndex(all_df, all_hierarchy))
+    selection: IdentityFilter = render_filters(index)
+    if selection.is_empty():
+        view, df, store, hierarchy, cube = version, all_df, all_store, all_hierarchy, all_cube
+    else:
+        view = f"{version}+{selection.signature()}" # the version of the filtered stages
+        mask: np.ndarray = stage_cache.get_or_compute("filter_mask", view, lambda: index.mask(selection))
+        df = stage_cache.get_or_compute("frame", view, lambda: all_df[mask].reset_index(drop=True))
+        store = stage_cache.get_or_compute("store", view, lambda: all_store.take(np.flatnonzero(mask)))
+        hierarchy = stage_cache.get_or_compute("hierarchy", view, lambda: OrgHierarchy.from_frame(df))
+        cube = stage_cache.get_or_compute("cube", view, lambda: get_filtered_cube(all_cube, df, selection), CONSTANTS.DEPARTMENT, CONSTANTS.LOCATION)
+        st.sidebar.caption(f"{len(df):,} of {len(all_df):,} identities match the filters")
 
-    df = pd.DataFrame(identities_dict)
     st.header("Identities DataFrame")
-    st.dataframe(df)
+    render_table(TableSource("identities", view, df), key="identities")
+
+    # --- Normalize the dictionary (on demand, every identity field, one page at a time) ---
+
+    if st.checkbox("Show Normalized Identities DataFrame"):
+        st.header("Normalized Identities DataFrame")
+        try: # the identities published with the frame, read from the snapshot when the version is not published
+            normalized: NormalizedSource = stage_cache.get_or_compute("normalized_source", version, lambda: NormalizedSource(
+                "normalized", version, all_df, artifacts.load("identities", version, read_identities)))
+            render_table(normalized, key="normalized", default_columns=normalized.columns()[:12])
+        except ValueError: # the snapshot was refreshed since the frame was built
+            st.warning("The identities changed since the frame was built, rerun to load the new version")
+
+    # --- Access (optional, collected concurrently from several APIs) ---
+
+    if st.sidebar.checkbox("Collect access (accounts, roles, entitlements)"):
+        per_identity = st.sidebar.checkbox("Include access items per identity (one request chain per identity)")
+        access: pd.DataFrame = stage_cache.get_or_compute("access", version, lambda: get_access_frame(
+            AsyncCollector(*sptk_service.get_credentials()).collect(identity_ids=all_df[CONSTANTS.ID].tolist() if per_identity else ())), per_identity)
+        st.header("Identity Access")
+        enriched: pd.DataFrame = stage_cache.get_or_compute("access_frame", version, lambda: join_access(all_df, access), per_identity)
+        render_table(TableSource("access", version, enriched), key="access")
+
+        # --- Access Mesh (sparse identity x access matrix) ---
+
+        st.header("Access Mesh")
+        access_types = sorted(access["access_type"].astype(str).unique())
+        mesh_types = tuple(st.multiselect("Access types", access_types, default=[ENTITLEMENTS] if ENTITLEMENTS in access_types else access_types))
+        mesh: AccessMesh = stage_cache.get_or_compute("access_mesh", version, lambda: AccessMesh(all_df, access[access["access_type"].astype(str).isin(mesh_types)]), per_identity, mesh_types)
+        if mesh.matrix.nnz == 0:
+            st.info("No access of the selected types")
+        else:
+            st.caption(f"{len(mesh):,} identities x {mesh.matrix.shape[1]:,} access items, {mesh.matrix.nnz:,} edges")
 
-    # --- Normalize the dictionary ---
+            st.subheader("Access held together (role mining)")
+            min_count = st.slider("Minimum identities holding both", min_value=2, max_value=100, value=5)
+            pairs: pd.DataFrame = stage_cache.get_or_compute("access_pairs", version, lambda: mesh.cooccurrence(min_count, top=200), per_identity, mesh_types, min_count)
+            html(get_access_cooccurrence(mesh, pairs).generate_html(), height=750)
+            names = mesh.access.set_index(ACCESS_KEY)["access_name"].astype(str)
+            top_pairs = pairs.head(100).assign(source=lambda pairs: pairs["source"].map(names), target=lambda pairs: pairs["target"].map(names))
+            st.plotly_chart(get_heatmap(top_pairs, "source", "target", "count", "Access", "Access", "Identities"))
+
+            st.subheader("Peer group outliers")
+            peer_by = st.radio("Peer group", [CONSTANTS.MANAGER_ID, CONSTANTS.DEPARTMENT], format_func=lambda by: "Manager" if by == CONSTANTS.MANAGER_ID else "Department", horizontal=True)
+            scores = stage_cache.get_or_compute("access_outliers", version, lambda: mesh.peer_outliers(get_peer_groups(all_df, peer_by)), per_identity, mesh_types, peer_by)
+            outliers = pd.DataFrame({CONSTANTS.NAME: all_df[CONSTANTS.NAME], CONSTANTS.DEPARTMENT: all_df[CONSTANTS.DEPARTMENT],
+                                     "access": mesh.degree, OUTLIER_SCORE: scores}).dropna(subset=[OUTLIER_SCORE])
+            st.plotly_chart(get_histogram(outliers, OUTLIER_SCORE, "Outlier score (1 = no access shared with peers)", nbins=50))
+            outliers = outliers.sort_values(OUTLIER_SCORE, ascending=False).head(100)
+            st.dataframe(outliers)
+
+            node = st.selectbox("Compare with the most similar identities", outliers.index, index=None, format_func=lambda node: str(all_df[CONSTANTS.NAME].iat[node]))
+            if node is not None:
+                peers = mesh.peers(node, top=10)
+                html(get_access_peers(mesh, all_df, node, peers).generate_html(), height=750)
 
-    df_normalized = pd.json_normalize(identities_dict)
-    st.header("Normalized Identities DataFrame")
-    st.dataframe(df_normalized)
     # --- Location ---
 
-    location_counts = df_normalized['attributes.location'].value_counts().reset_index()
-    location_counts.columns = ['location', 'count']
+    location_counts = cube.marginal(CONSTANTS.LOCATION)
     st.header("Location")
     st.bar_chart(location_counts.set_index('location'))
     st.plotly_chart(get_pie(location_counts, 'count', 'location'))
 
     # --- Department ---
 
-    department_counts = df_normalized['attributes.department'].value_counts().reset_index()
-    department_counts.columns = ['department', 'count']
+    department_counts = cube.marginal(CONSTANTS.DEPARTMENT)
     st.header("Department")
     st.bar_chart(department_counts.set_index('department')) 
     st.plotly_chart(get_pie(department_counts, 'count', 'department'))
@@ -64,31 +184,122 @@ def main():
     # --- Heatmap ---
 
     st.header("Department Distribution by Location")
-    st.plotly_chart(get_heatmap(df_normalized,'attributes.department', 'attributes.location', 'count', 'Department', 'Location', 'Identities'))
+    st.plotly_chart(get_heatmap(cube.pairs(), CONSTANTS.DEPARTMENT, CONSTANTS.LOCATION, 'count', 'Department', 'Location', 'Identities'))
 
     # --- Scatter Plot ---
 
     st.header("Department vs Location Scatter Plot")
-    st.plotly_chart(get_scatter(df_normalized, 'attributes.department', 'attributes.location', 'count', 'Department', 'Location', 'Identities'))
+    st.plotly_chart(get_scatter(cube.pairs(), CONSTANTS.DEPARTMENT, CONSTANTS.LOCATION, 'count', 'Department', 'Location', 'Identities'))
 
     # --- 3D Scatter Plot ---
 
     st.header("3D Department-Location-Count Visualization")
-    st.plotly_chart(get_scatter_3d(df_normalized, 'attributes.department', 'attributes.location', 'count', 'Department', 'Location', 'Identities'))
+    st.plotly_chart(get_scatter_3d(cube.pairs(), CONSTANTS.DEPARTMENT, CONSTANTS.LOCATION, 'count', 'Department', 'Location', 'Identities'))
 
     # --- Map ---
 
     st.header("Map Locations and Counts")
-    st.pydeck_chart(get_pydeck_map(identities=identities))
+    map_mode = st.radio("Map", MAP_MODES, format_func=str.capitalize, horizontal=True)
+    breakdown = CONSTANTS.DEPARTMENT if map_mode == "columns" and st.checkbox("Break down locations by department") else None
+    st.pydeck_chart(artifacts.get_or_compute("map", view, lambda: get_pydeck_map(store, breakdown=breakdown, mode=map_mode), map_mode, breakdown))
 
     # --- Graph ---
 
     st.header("Graph: Reports To")
-    net: Network = get_reportsto(identities=identities)
-    net.save_graph("identities_reportsto.html")
-    with open("identities_reportsto.html", "r") as f:
-        html_code = f.read()
-    html(html_code, height=750)
+    graph_modes = ["Interactive (pyvis)", "Large organization (WebGL)", "Org tree (expand on demand)", "Summary (clustered)"]
+    graph_mode = st.radio("Rendering", graph_modes, index=0 if len(df) <= LARGE_GRAPH_NODES else 1, horizontal=True)
+    if graph_mode == graph_modes[0]:
+        html(artifacts.get_or_compute("graph_html", view, lambda: get_reportsto(store).generate_html()), height=750)
+    elif graph_mode == graph_modes[1]:
+        st.pydeck_chart(artifacts.get_or_compute("graph_deck", view, lambda: get_reportsto_deck(df, hierarchy)))
+    elif graph_mode == graph_modes[3]:
+        col_by, col_threshold = st.columns(2)
+        by = col_by.radio("Group by", CLUSTER_MODES, format_func=str.capitalize, horizontal=True)
+        threshold = col_threshold.slider("Minimum identities per group", min_value=1, max_value=500, value=50)
+        summary: GraphSummary = stage_cache.get_or_compute("graph_summary", view, lambda: GraphSummary(df, hierarchy, by, threshold), by, threshold)
+        html(get_reportsto_summary(summary).generate_html(), height=750)
+
+        group = st.selectbox("Drill into group", range(len(summary.labels)), index=None,
+                             format_func=lambda group: f"{summary.labels[group]} ({summary.sizes[group]:,})")
+        if group is not None:
+            members = summary.members(group)
+            if len(members) > LARGE_GRAPH_NODES:
+                st.warning(f"{len(members):,} identities, lower the threshold or pick a smaller group for the detailed graph")
+            else:
+                detail_html = stage_cache.get_or_compute("graph_html", view, lambda: get_reportsto(store.take(members)).generate_html(), by, threshold, group)
+                html(detail_html, height=750)
+    else:
+        if st.session_state.get("org_tree_version") != view:
+            st.session_state.org_tree = OrgTreeView(hierarchy)
+            st.session_state.org_tree_version = view
+        tree: OrgTreeView = st.session_state.org_tree
+        label = lambda node: f"{df[CONSTANTS.NAME].iat[node]} ({hierarchy.subtree_size[node] - 1})"
+
+        col_expand, col_collapse = st.columns(2)
+        with col_expand:
+            node = st.selectbox("Expand manager", tree.collapsed_managers(hierarchy), format_func=label, index=None)
+            if node is not None and st.button("Expand"):
+                tree.expand(hierarchy, node)
+                st.rerun()
+        with col_collapse:
+            node = st.selectbox("Collapse manager", tree.expanded, format_func=label, index=None)
+            if node is not None and st.button("Collapse"):
+                tree.collapse(hierarchy, node)
+                st.rerun()
+
+        html(get_reportsto_tree(df, hierarchy, tree).generate_html(), height=750)
+
+    # --- Org Analytics ---
+
+    st.header("Org Analytics")
+    analytics: OrgAnalytics = artifacts.get_or_compute("analytics", version, lambda: OrgAnalytics(all_df, all_hierarchy))
+    if not selection.is_empty(): # measured on the whole organization, shown for the filtered identities
+        analytics = stage_cache.get_or_compute("analytics", view, lambda: analytics.where(mask))
+        st.caption("Span, depth and headcount are measured on the whole organization, for the identities matching the filters")
+    summary = analytics.summary()
+    for column, (label, value) in zip(st.columns(6), [
+            ("Managers", summary["managers"]), ("Max span", summary["max_span"]), ("Max depth", summary["max_depth"]),
+            ("Orphans", summary["orphans"]), ("Self references", summary["self_references"]), ("Reporting loops", summary["cycles"])]):
+        column.metric(label, f"{value:,}")
+
+    span_of_control = analytics.span_of_control()
+    col_span, col_depth = st.columns(2)
+    with col_span:
+        st.plotly_chart(get_histogram(span_of_control, DIRECT_REPORTS, "Direct reports (span of control)", log_y=True))
+    with col_depth:
+        st.plotly_chart(get_bar(analytics.depth_distribution(), DEPTH, "count", "Reporting depth", "Identities"))
+
+    min_reports = st.number_input("Managers with at least this many direct reports", min_value=1, value=10, step=1)
+    wide = span_of_control[span_of_control[DIRECT_REPORTS] >= min_reports]
+    st.plotly_chart(get_bar(wide.head(50), CONSTANTS.NAME, DIRECT_REPORTS, "Manager", "Direct reports", color_attr=CONSTANTS.DEPARTMENT))
+    st.dataframe(wide[[CONSTANTS.NAME, CONSTANTS.DEPARTMENT, DIRECT_REPORTS, HEADCOUNT, DEPTH]].head(500))
+
+    if analytics.cycles:
+        st.subheader("Reporting loops")
+        st.dataframe(analytics.cycle_table())
+
+    # --- Cache statistics ---
+
+    with st.sidebar.expander("Cache statistics"):
+        entries, size = stage_cache.size()
+        table_entries, table_size = table_cache.size()
+        st.caption(f"{entries} entries, {size / 2**20:,.1f} MiB, tables {table_entries} entries, {table_size / 2**20:,.1f} MiB")
+        st.dataframe(pd.DataFrame.from_dict({**stage_cache.stats(), **table_cache.stats()}, orient="index"))
+
+def render_diagnostics(trace: Trace):
+    """Shows the spans of the run and offers them for download."""
+    st.header("Diagnostics")
+    records = trace.records()
+    st.caption("Stages computed in this run, cached stages only show up when they were recomputed.")
+    st.dataframe(pd.DataFrame({
+        "stage": ["\u2003" * record["depth"] + record["name"] for record in records],
+        "ms": [round(record["seconds"] * 1000, 1) for record in records],
+        "peak MiB": [round(record["peak_bytes"] / 2**20, 2) if "peak_bytes" in record else None for record in records],
+        "inputs": [", ".join(f"{key}={value:,}" if isinstance(value, int) else f"{key}={value}" for key, value in record["inputs"].items()) for record in records],
+    }), use_container_width=True)
+    col_json, col_chrome = st.columns(2)
+    col_json.download_button("Download trace (JSON)", trace.to_json(), file_name="trace.json", mime="application/json")
+    col_chrome.download_button("Download Chrome trace", trace.to_chrome_trace(), file_name="trace.chrome.json", mime="application/json")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
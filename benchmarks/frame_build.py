@@ -0,0 +1,50 @@
+"""
+Copyright (c) 2024-2025, All rights reserved, Use subject to license terms.
+Scott Fehrman, scott.fehrman@sailpoint.com
+
+Compares the legacy to_dict -> DataFrame -> json_normalize conversion with the
+columnar identity frame.
+
+    python -m benchmarks.frame_build --sizes 10000,100000,500000
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+import pandas as pd
+from typing import Any, Callable, List, Tuple
+from utilities.synthetic import make_identities
+from utilities.frames import get_identity_frame
+
+def legacy_frames(identities: List[Any]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """The conversion app.main used before the columnar frame."""
+    identities_dict = [identity.to_dict() for identity in identities]
+    return pd.DataFrame(identities_dict), pd.json_normalize(identities_dict)
+
+def measure(fn: Callable[[], Any]) -> Tuple[float, float]:
+    """Returns wall time in seconds and peak traced allocation in MiB."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 2**20
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000", help="comma separated tenant sizes")
+    args = parser.parse_args()
+
+    print(f"{'size':>10} {'legacy s':>10} {'legacy MiB':>11} {'frame s':>9} {'frame MiB':>10} {'speedup':>8} {'memory':>7}")
+    for size in [int(size) for size in args.sizes.split(",")]:
+        identities = make_identities(size)
+        legacy_time, legacy_peak = measure(lambda: legacy_frames(identities))
+        frame_time, frame_peak = measure(lambda: get_identity_frame(identities))
+        print(f"{size:>10} {legacy_time:>10.2f} {legacy_peak:>11.1f} {frame_time:>9.2f} {frame_peak:>10.1f} "
+              f"{legacy_time / frame_time:>7.1f}x {legacy_peak / frame_peak:>6.1f}x")
+
+if __name__ == "__main__":
+    main()
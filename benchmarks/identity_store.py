@@ -0,0 +1,63 @@
+"""
+Copyright (c) 2024-2025, All rights reserved, Use subject to license terms.
+Scott Fehrman, scott.fehrman@sailpoint.com
+
+Compares the memory held per identity by the Identity models with the compact
+identity store, and times the store build and the map and graph builders on it.
+
+    python -m benchmarks.identity_store --sizes 10000,100000,500000
+"""
+
+import argparse
+import gc
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Tuple
+from utilities.synthetic import make_coordinates_manager, make_identities
+from utilities.frames import get_identity_frame
+from utilities.graphs import get_reportsto
+from utilities.maps import get_location_data
+from utilities.store import IdentityStore
+
+GRAPH_LIMIT: int = 20000 # pyvis is only timed up to this size
+
+def retained(fn: Callable[[], Any]) -> Tuple[Any, float, float]:
+    """Returns the result, the wall time in seconds and the bytes still allocated by fn after it returned."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, current
+
+def timed(fn: Callable[[], Any]) -> float:
+    """Returns wall time in seconds."""
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000", help="comma separated tenant sizes")
+    args = parser.parse_args()
+
+    directory = tempfile.TemporaryDirectory()
+    coordmgr = make_coordinates_manager(directory.name)
+
+    print(f"{'size':>10} {'model B/id':>11} {'store B/id':>11} {'ratio':>7} {'build s':>8} {'map s':>7} {'graph s':>8}")
+    for size in [int(size) for size in args.sizes.split(",")]:
+        identities, _, model_bytes = retained(lambda: make_identities(size))
+        df = get_identity_frame(identities)
+        store, build_time, store_bytes = retained(lambda: IdentityStore.from_frame(df))
+        map_time = timed(lambda: get_location_data(store, coordmgr))
+        graph_time = timed(lambda: get_reportsto(store)) if size <= GRAPH_LIMIT else float("nan")
+        print(f"{size:>10} {model_bytes / size:>11.0f} {store_bytes / size:>11.1f} {model_bytes / store_bytes:>6.0f}x "
+              f"{build_time:>8.2f} {map_time:>7.3f} {graph_time:>8.2f}")
+        del identities, df, store
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Copyright (c) 2024-2025, All rights reserved, Use subject to license terms.
+Scott Fehrman, scott.fehrman@sailpoint.com
+
+Times and memory profiles every stage of the dashboard on synthetic tenants, fully
+offline: the fetch runs against a fake IdentitiesApi and the map against a stubbed
+geocoder. Results are written as JSON; pass a previous result file with --baseline
+to flag the stages that got slower or use more memory.
+
+    python -m benchmarks.stages --sizes 1000,10000,100000 --output bench.json
+    python -m benchmarks.stages --sizes 1000,10000,100000 --baseline bench.json
+"""
+
+import argparse
+import json
+import platform
+import sys
+import tempfile
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+import utilities.constants as CONSTANTS
+from benchmarks.frame_build import measure
+from utilities.synthetic import SyntheticIdentitiesApi, make_coordinates_manager, make_identities
+from utilities.aggregates import IdentityCube
+from utilities.charts import get_bar, get_heatmap, get_pie, get_scatter, get_scatter_3d
+from utilities.coordinates import CoordinatesManager
+from utilities.frames import get_identity_frame
+from utilities.graphs import get_reportsto
+from utilities.loader import IdentityLoader
+from utilities.maps import MAP_MODES, get_pydeck_map
+from utilities.store import IdentityStore
+
+def run_size(size: int, coordmgr: CoordinatesManager, graph_limit: int, latency: float) -> List[Dict[str, Any]]:
+    """Runs every stage on a tenant of the given size, each stage feeds the next one."""
+    results: List[Dict[str, Any]] = []
+    outputs: Dict[str, Any] = {}
+
+    def stage(name: str, fn: Callable[[], Any], items: int) -> None:
+        holder: List[Any] = []
+        seconds, peak_mib = measure(lambda: holder.append(fn()))
+        outputs[name] = holder[0]
+        results.append({"size": size, "stage": name, "items": items, "seconds": round(seconds, 4), "peak_mib": round(peak_mib, 2)})
+        print(f"{size:>10} {name:<22} {seconds:>9.3f}s {peak_mib:>10.1f} MiB")
+
+    api = SyntheticIdentitiesApi(make_identities(size), latency=latency)
+    stage("fetch", lambda: IdentityLoader(api.list_identities, workers=8).load(), size)
+    identities = outputs["fetch"]
+
+    stage("frame", lambda: get_identity_frame(identities), size)
+    df = outputs["frame"]
+
+    stage("cube", lambda: IdentityCube(df, CONSTANTS.DEPARTMENT, CONSTANTS.LOCATION), size)
+    cube: IdentityCube = outputs["cube"]
+    pairs = cube.pairs()
+    locations = cube.marginal(CONSTANTS.LOCATION)
+    stage("charts.get_pie", lambda: get_pie(locations, "count", CONSTANTS.LOCATION), len(locations))
+    stage("charts.get_bar", lambda: get_bar(locations, CONSTANTS.LOCATION, "count", "Location", "Identities"), len(locations))
+    stage("charts.get_heatmap", lambda: get_heatmap(pairs, CONSTANTS.DEPARTMENT, CONSTANTS.LOCATION, "count", "Department", "Location", "Identities"), len(pairs))
+    stage("charts.get_scatter", lambda: get_scatter(pairs, CONSTANTS.DEPARTMENT, CONSTANTS.LOCATION, "count", "Department", "Location", "Identities"), len(pairs))
+    stage("charts.get_scatter_3d", lambda: get_scatter_3d(pairs, CONSTANTS.DEPARTMENT, CONSTANTS.LOCATION, "count", "Department", "Location", "Identities"), len(pairs))
+
+    stage("store", lambda: IdentityStore.from_frame(df), size)
+    store: IdentityStore = outputs["store"]
+    for mode in MAP_MODES:
+        stage(f"get_pydeck_map.{mode}", lambda: get_pydeck_map(store, mode=mode, coordmgr=coordmgr).to_json(), size)
+    stage("get_pydeck_map.breakdown", lambda: get_pydeck_map(store, breakdown=CONSTANTS.DEPARTMENT, coordmgr=coordmgr).to_json(), size)
+
+    if size <= graph_limit:
+        stage("get_reportsto", lambda: get_reportsto(store).generate_html(), size)
+
+    return results
+
+def compare(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], tolerance: float) -> List[str]:
+    """Returns a line per stage that is slower or uses more memory than the baseline by more than the tolerance."""
+    previous = {(result["size"], result["stage"]): result for result in baseline}
+    regressions: List[str] = []
+    for result in results:
+        before = previous.get((result["size"], result["stage"]))
+        if not before:
+            continue
+        for metric in ("seconds", "peak_mib"):
+            if before[metric] > 0 and result[metric] > before[metric] * (1 + tolerance):
+                regressions.append(f"{result['stage']} at {result['size']}: {metric} {before[metric]} -> {result[metric]}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma separated tenant sizes, up to 1000000")
+    parser.add_argument("--graph-limit", type=int, default=20000, help="largest size get_reportsto (pyvis) is run for")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds of latency per fake API page")
+    parser.add_argument("--output", default="bench.json", help="the JSON result file")
+    parser.add_argument("--baseline", help="a previous result file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown or growth before a stage is flagged")
+    args = parser.parse_args()
+
+    baseline: Optional[Dict[str, Any]] = None
+    if args.baseline: # read first, the output may replace the baseline file
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+
+    results: List[Dict[str, Any]] = []
+    with tempfile.TemporaryDirectory() as directory:
+        coordmgr = make_coordinates_manager(directory)
+        for size in [int(size) for size in args.sizes.split(",")]:
+            results.extend(run_size(size, coordmgr, args.graph_limit, args.latency))
+
+    report: Dict[str, Any] = {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "results": results,
+    }
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"... Results written to {args.output}")
+
+    if baseline:
+        regressions = compare(results, baseline["results"], args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Copyright (c) 2024-2025, All rights reserved, Use subject to license terms.
+Scott Fehrman, scott.fehrman@sailpoint.com
+
+Headless export of every visualization, for scheduled reports. Runs the same
+pipeline as the Streamlit app once and writes the outputs to a directory: the plotly
+figures as HTML, JSON and (with kaleido installed) PNG, the identity and map data as
+CSV, the maps and the WebGL graph as standalone deck.gl HTML and the reports-to graph
+as vis-network HTML. Independent renders run in parallel processes.
+
+    python export.py --out reports/2025-06-01 --stages charts,map,graph --formats html,png
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+import pandas as pd
+import utilities.constants as CONSTANTS
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from plotly.graph_objects import Figure
+from utilities.aggregates import IdentityCube
+from utilities.coordinates import CoordinatesManager
+from utilities.analytics import OrgAnalytics, DIRECT_REPORTS, DEPTH
+from utilities.charts import get_bar, get_heatmap, get_histogram, get_pie, get_scatter, get_scatter_3d
+from utilities.clusters import CLUSTER_MODES, GraphSummary
+from utilities.frames import get_identity_frame
+from utilities.graphs import get_reportsto, get_reportsto_deck, get_reportsto_summary
+from utilities.hierarchy import OrgHierarchy
+from utilities.maps import MAP_MODES, get_location_data, get_pydeck_map
+from utilities.snapshot import IdentitySnapshot
+from utilities.store import IdentityStore
+from utilities.synthetic import make_coordinates_manager, make_identities
+
+STAGES: List[str] = ["frame", "charts", "map", "graph", "analytics"]
+FORMATS: List[str] = ["html", "json", "png"]
+
+def write_figure(fig: Figure, path: str, formats: List[str]) -> List[str]:
+    """Writes a plotly figure in each format, PNG is skipped with a warning when kaleido is missing."""
+    written: List[str] = []
+    for fmt in formats:
+        target = f"{path}.{fmt}"
+        if fmt == "html":
+            fig.write_html(target, include_plotlyjs="cdn")
+        elif fmt == "json":
+            fig.write_json(target)
+        else:
+            try:
+                fig.write_image(target)
+            except (ImportError, ValueError) as e:
+                print(f"... Warning: {os.path.basename(target)} not written, PNG export needs kaleido ({e}) ...")
+                continue
+        written.append(target)
+    return written
+
+def write_deck(deck: Any, path: str, formats: List[str]) -> List[str]:
+    """Writes a pydeck deck as standalone HTML and, when requested, as deck.gl JSON."""
+    written: List[str] = [f"{path}.html"]
+    deck.to_html(f"{path}.html", open_browser=False, notebook_display=False)
+    if "json" in formats:
+        with open(f"{path}.json", "w") as file:
+            file.write(deck.to_json())
+        written.append(f"{path}.json")
+    return written
+
+def write_built(build: Callable[..., Any], build_args: Tuple[Any, ...], write: Callable[..., List[str]], path: str, formats: List[str]) -> List[str]:
+    """Builds a figure or deck in the render process and writes it with write_figure or write_deck."""
+    return write(build(*build_args), path, formats)
+
+def coordinates_manager(coordinates: Optional[str]) -> Optional[CoordinatesManager]:
+    """Returns the offline manager of the synthetic locations cached in the coordinates directory, None for the shared one."""
+    return make_coordinates_manager(coordinates) if coordinates else None
+
+def write_map(store: IdentityStore, mode: str, breakdown: Optional[str], path: str, formats: List[str], coordinates: Optional[str]) -> List[str]:
+    """Builds and writes a map, the coordinates directory is passed instead of the manager, which does not pickle."""
+    return write_deck(get_pydeck_map(store, breakdown=breakdown, mode=mode, coordmgr=coordinates_manager(coordinates)), path, formats)
+
+def write_reportsto(store: IdentityStore, path: str) -> List[str]:
+    """Builds and writes the vis-network reports-to graph, built in the worker process from the compact store."""
+    with open(f"{path}.html", "w") as file:
+        file.write(get_reportsto(store).generate_html())
+    return [f"{path}.html"]
+
+def write_summary(df: pd.DataFrame, hierarchy: OrgHierarchy, by: str, path: str) -> List[str]:
+    """Builds and writes the clustered reports-to graph."""
+    with open(f"{path}.html", "w") as file:
+        file.write(get_reportsto_summary(GraphSummary(df, hierarchy, by)).generate_html())
+    return [f"{path}.html"]
+
+def write_analytics(df: pd.DataFrame, hierarchy: OrgHierarchy, out: str, formats: List[str]) -> List[str]:
+    """Computes the org analytics and writes the metrics, the span of control and the depth distribution."""
+    analytics = OrgAnalytics(df, hierarchy)
+    span_of_control = analytics.span_of_control()
+    path = lambda name: os.path.join(out, name)
+    return (write_csv(analytics.metrics, path("org_metrics"))
+            + write_figure(get_histogram(span_of_control, DIRECT_REPORTS, "Direct reports (span of control)", log_y=True), path("span_of_control"), formats)
+            + write_figure(get_bar(analytics.depth_distribution(), DEPTH, "count", "Reporting depth", "Identities"), path("depth"), formats))
+
+def write_csv(df: pd.DataFrame, path: str) -> List[str]:
+    """Writes a DataFrame as CSV."""
+    df.to_csv(f"{path}.csv", index=False)
+    return [f"{path}.csv"]
+
+def plan(stages: List[str], df: pd.DataFrame, store: IdentityStore, out: str, formats: List[str],
+         graph_limit: int, coordinates: Optional[str] = None) -> List[Tuple[str, Callable[..., List[str]], Tuple[Any, ...]]]:
+    """
+    Returns the render tasks of the selected stages as (name, function, arguments).
+
+    Only the shared inputs (cube, hierarchy, location data) are computed here, once; the
+    figures, decks, summaries and analytics are built by the tasks, so the tasks are
+    independent and the building runs in parallel in the render processes.
+    """
+    tasks: List[Tuple[str, Callable[..., List[str]], Tuple[Any, ...]]] = []
+    path = lambda name: os.path.join(out, name)
+
+    if "frame" in stages:
+        tasks.append(("identities", write_csv, (df, path("identities"))))
+
+    if "charts" in stages:
+        cube = IdentityCube(df, CONSTANTS.DEPARTMENT, CONSTANTS.LOCATION)
+        pairs = cube.pairs()
+        for attr in (CONSTANTS.LOCATION, CONSTANTS.DEPARTMENT):
+            counts = cube.marginal(attr)
+            tasks.append((f"{attr}_pie", write_built, (get_pie, (counts, "count", attr), write_figure, path(f"{attr}_pie"), formats)))
+            tasks.append((f"{attr}_bar", write_built, (get_bar, (counts, attr, "count", attr.capitalize(), "Identities"), write_figure, path(f"{attr}_bar"), formats)))
+        labels = (CONSTANTS.DEPARTMENT, CONSTANTS.LOCATION, "count", "Department", "Location", "Identities")
+        for name, build in (("heatmap", get_heatmap), ("scatter", get_scatter), ("scatter_3d", get_scatter_3d)):
+            tasks.append((name, write_built, (build, (pairs, *labels), write_figure, path(name), formats)))
+
+    if "map" in stages:
+        tasks.append(("map_data", write_csv, (get_location_data(store, coordinates_manager(coordinates)), path("map_data")))) # resolves new locations once, the maps read them from the cache
+        for mode in MAP_MODES:
+            tasks.append((f"map_{mode}", write_map, (store, mode, None, path(f"map_{mode}"), formats, coordinates)))
+        tasks.append(("map_breakdown", write_map, (store, "columns", CONSTANTS.DEPARTMENT, path("map_breakdown"), formats, coordinates)))
+
+    if "graph" in stages or "analytics" in stages:
+        hierarchy = OrgHierarchy.from_frame(df)
+
+    if "graph" in stages:
+        if len(store) <= graph_limit:
+            tasks.append(("reportsto", write_reportsto, (store, path("reportsto"))))
+        else:
+            print(f"... Notice: {len(store):,} identities, the interactive graph is skipped (see --graph-limit) ...")
+        tasks.append(("reportsto_webgl", write_built, (get_reportsto_deck, (df, hierarchy), write_deck, path("reportsto_webgl"), formats)))
+        for by in CLUSTER_MODES:
+            tasks.append((f"reportsto_summary_{by}", write_summary, (df, hierarchy, by, path(f"reportsto_summary_{by}"))))
+
+    if "analytics" in stages:
+        tasks.append(("analytics", write_analytics, (df, hierarchy, out, formats)))
+
+    return tasks
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default="export", help="the output directory")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"comma separated stages: {', '.join(STAGES)}")
+    parser.add_argument("--formats", default="html,json", help=f"comma separated figure formats: {', '.join(FORMATS)}")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="parallel render processes")
+    parser.add_argument("--graph-limit", type=int, default=2000, help="largest tenant the interactive graph is rendered for")
+    parser.add_argument("--refresh", action="store_true", help="refresh the identity snapshot from the tenant first")
+    parser.add_argument("--synthetic", type=int, default=0, help="export a synthetic tenant of this size instead (offline)")
+    args = parser.parse_args()
+
+    stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    formats = [fmt.strip() for fmt in args.formats.split(",") if fmt.strip()]
+    for value, allowed in [(stage, STAGES) for stage in stages] + [(fmt, FORMATS) for fmt in formats]:
+        if value not in allowed:
+            parser.error(f"unknown value '{value}', expected one of {', '.join(allowed)}")
+    os.makedirs(args.out, exist_ok=True)
+    start = time.perf_counter()
+
+    coordinates: Optional[str] = None
+    if args.synthetic: # offline: the synthetic locations are resolved by a stub, never by Nominatim
+        identities = make_identities(args.synthetic)
+        coordinates = tempfile.mkdtemp(prefix="coordinates-")
+    else:
+        from utilities.sptk import sptk_service
+        snapshot = IdentitySnapshot(tenant=str(getattr(sptk_service.config, "base_url", "default")) if sptk_service else "default")
+        if args.refresh:
+            if sptk_service is None:
+                raise SystemExit("SailPoint configuration error, see config.json")
+            snapshot.refresh(sptk_service.get_identities_api().list_identities, search_api=sptk_service.get_search_api(), workers=8, max_results=10000)
+        identities = snapshot.read()
+    if not identities:
+        raise SystemExit("No identities in the snapshot, run with --refresh or start the app first")
+
+    df = get_identity_frame(identities)
+    del identities
+    store = IdentityStore.from_frame(df)
+    tasks = plan(stages, df, store, args.out, formats, args.graph_limit, coordinates)
+    print(f"... {len(df):,} identities, {len(tasks)} renders planned in {time.perf_counter() - start:.1f}s ...")
+
+    manifest: Dict[str, Any] = {"identities": len(df), "stages": stages, "formats": formats, "outputs": {}, "errors": {}}
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futures: Dict[str, Future] = {name: pool.submit(fn, *fn_args) for name, fn, fn_args in tasks}
+        for name, future in futures.items():
+            try:
+                manifest["outputs"][name] = [os.path.relpath(target, args.out) for target in future.result()]
+            except Exception as e: # one failed render does not stop the others
+                print(f"... Error: {name} could not be rendered: {e} ...")
+                manifest["errors"][name] = str(e)
+
+    if coordinates:
+        shutil.rmtree(coordinates, ignore_errors=True)
+    manifest["seconds"] = round(time.perf_counter() - start, 2)
+    with open(os.path.join(args.out, "manifest.json"), "w") as file:
+        json.dump(manifest, file, indent=2)
+    print(f"... Exported {sum(len(files) for files in manifest['outputs'].values())} files to {args.out} in {manifest['seconds']}s ...")
+    if manifest["errors"]:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
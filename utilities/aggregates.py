@@ -0,0 +1,82 @@
+"""
+Copyright (c) 2024-2025, All rights reserved, Use subject to license terms.
+Scott Fehrman, scott.fehrman@sailpoint.com
+"""
+
+import pandas as pd
+from typing import Dict, Iterable
+
+class IdentityCube:
+    """
+    Pre-aggregated identity counts over two attributes.
+
+    This class groups the identity frame once by the two attributes (for example
+    department x location). The pair counts feed the heatmap and scatter charts and the
+    single attribute counts (marginals) are summed from the cube instead of scanning
+    the frame again.
+    """
+    x_attr: str
+    y_attr: str
+    data_attr: str
+    cube: pd.DataFrame # one row per (x, y) pair, missing values kept so marginals are exact
+
+    def __init__(self, df: pd.DataFrame, x_attr: str, y_attr: str, data_attr: str = "count"):
+        """
+        Initialize the IdentityCube.
+
+        Args:
+            df (pd.DataFrame): The identity frame
+            x_attr (str): The first attribute (column) to group by
+            y_attr (str): The second attribute (column) to group by
+            data_attr (str): The name of the count column
+        """
+
+        self.x_attr = x_attr
+        self.y_attr = y_attr
+        self.data_attr = data_attr
+        self.cube = df.groupby([x_attr, y_attr], observed=True, dropna=False).size().reset_index(name=data_attr)
+
+    def where(self, values: Dict[str, Iterable[str]]) -> "IdentityCube":
+        """
+        Returns the cube restricted to the given values of its attributes.
+
+        Filtering on the cube attributes only drops rows of the cube, the identities are
+        not scanned again.
+
+        Args:
+            values (Dict[str, Iterable[str]]): The selected values per attribute (x or y)
+
+        Returns:
+            IdentityCube: A cube with the matching pairs only
+        """
+        cube = self.cube
+        for attr, selected in values.items():
+            if attr not in (self.x_attr, self.y_attr):
+                raise ValueError(f"... Warning: {attr} is not an attribute of the cube ...")
+            cube = cube[cube[attr].isin(list(selected))]
+
+        sliced = IdentityCube.__new__(IdentityCube)
+        sliced.x_attr, sliced.y_attr, sliced.data_attr = self.x_attr, self.y_attr, self.data_attr
+        sliced.cube = cube.reset_index(drop=True)
+        return sliced
+
+    def pairs(self) -> pd.DataFrame:
+        """Returns the counts for every (x, y) pair where both attributes have a value."""
+        return self.cube.dropna(subset=[self.x_attr, self.y_attr]).reset_index(drop=True)
+
+    def marginal(self, attr: str) -> pd.DataFrame:
+        """
+        Returns the counts for one attribute, sorted descending like value_counts.
+
+        Args:
+            attr (str): Either the x or the y attribute of the cube
+
+        Returns:
+            pd.DataFrame: Two columns, the attribute and the count
+        """
+        if attr not in (self.x_attr, self.y_attr):
+            raise ValueError(f"... Warning: {attr} is not an attribute of the cube ...")
+
+        counts = self.cube.groupby(attr, observed=True)[self.data_attr].sum()
+        counts = counts[counts > 0].sort_values(ascending=False)
+        return counts.reset_index().astype({attr: "object"})
@@ -0,0 +1,140 @@
+"""
+Copyright (c) 2024-2025, All rights reserved, Use subject to license terms.
+Scott Fehrman, scott.fehrman@sailpoint.com
+"""
+
+import copy
+import numpy as np
+import pandas as pd
+import utilities.constants as CONSTANTS
+from typing import Any, Dict, List
+from utilities.hierarchy import OrgHierarchy
+
+DIRECT_REPORTS: str = "direct_reports"
+DEPTH: str = "depth"
+HEADCOUNT: str = "headcount"
+
+class OrgAnalytics:
+    """
+    Reporting structure metrics over the manager hierarchy.
+
+    Everything is derived in linear time from the OrgHierarchy: span of control (direct
+    reports), reporting depth and subtree headcount per identity, plus the reporting
+    loops, self references and orphans (managers outside the tenant). A filtered view
+    selects rows of the metrics of the whole tenant (see where), so a filter does not
+    turn the managers it leaves out into orphans or shorten the reporting chains.
+    """
+    metrics: pd.DataFrame # one row per identity
+    names: np.ndarray # names of all identities by node index, for the reporting loops
+    cycles: List[List[int]] # node indexes of each reporting loop, in reporting order
+    roots: int
+    orphans: int
+    self_references: int
+
+    def __init__(self, df: pd.DataFrame, hierarchy: OrgHierarchy):
+        """
+        Initialize the OrgAnalytics.
+
+        Args:
+            df (pd.DataFrame): The identity frame (see utilities.frames)
+            hierarchy (OrgHierarchy): The hierarchy built from the same frame
+        """
+
+        self.metrics = pd.DataFrame({
+            CONSTANTS.ID: df[CONSTANTS.ID].to_numpy(),
+            CONSTANTS.NAME: df[CONSTANTS.NAME].to_numpy(),
+            CONSTANTS.DEPARTMENT: df[CONSTANTS.DEPARTMENT].to_numpy(),
+            DIRECT_REPORTS: [len(children) for children in hierarchy.children],
+            DEPTH: hierarchy.depth,
+            HEADCOUNT: [size - 1 for size in hierarchy.subtree_size],
+        })
+        self.names = df[CONSTANTS.NAME].to_numpy()
+        self.cycles = find_cycles(hierarchy.manager)
+        self._roots = np.asarray(hierarchy.roots, dtype=np.int64)
+        self._orphans = np.asarray(hierarchy.orphans, dtype=np.int64)
+        self._self_references = np.asarray(hierarchy.self_references, dtype=np.int64)
+        self.roots = len(self._roots)
+        self.orphans = len(self._orphans)
+        self.self_references = len(self._self_references)
+
+    def where(self, mask: np.ndarray) -> "OrgAnalytics":
+        """
+        Returns the analytics of the selected identities, measured on the whole hierarchy.
+
+        Span, depth and headcount stay those of the full organization; the counts only
+        include the selected identities and the loops they are part of.
+
+        Args:
+            mask (np.ndarray): Boolean mask over the identities of the frame
+        """
+        subset = copy.copy(self)
+        subset.metrics = self.metrics[mask].reset_index(drop=True)
+        subset.cycles = [cycle for cycle in self.cycles if mask[cycle].any()]
+        subset.roots = int(mask[self._roots].sum())
+        subset.orphans = int(mask[self._orphans].sum())
+        subset.self_references = int(mask[self._self_references].sum())
+        return subset
+
+    def summary(self) -> Dict[str, Any]:
+        """Returns the headline numbers for the dashboard."""
+        managers = self.metrics[self.metrics[DIRECT_REPORTS] > 0]
+        return {
+            "identities": len(self.metrics),
+            "managers": len(managers),
+            "max_span": int(managers[DIRECT_REPORTS].max()) if len(managers) else 0,
+            "avg_span": round(float(managers[DIRECT_REPORTS].mean()), 1) if len(managers) else 0.0,
+            "max_depth": int(self.metrics[DEPTH].max()) if len(self.metrics) else 0,
+            "roots": self.roots,
+            "orphans": self.orphans,
+            "self_references": self.self_references,
+            "cycles": len(self.cycles),
+        }
+
+    def span_of_control(self, min_reports: int = 1) -> pd.DataFrame:
+        """Returns the managers with at least min_reports direct reports, largest span first."""
+        managers = self.metrics[self.metrics[DIRECT_REPORTS] >= min_reports]
+        return managers.sort_values(DIRECT_REPORTS, ascending=False).reset_index(drop=True)
+
+    def depth_distribution(self) -> pd.DataFrame:
+        """Returns the number of identities per reporting depth."""
+        return self.metrics[DEPTH].value_counts().sort_index().rename_axis(DEPTH).reset_index(name="count")
+
+    def cycle_table(self) -> pd.DataFrame:
+        """Returns one row per reporting loop with the names in reporting order."""
+        return pd.DataFrame({
+            "size": [len(cycle) for cycle in self.cycles],
+            "loop": [" -> ".join(str(self.names[node]) for node in cycle + cycle[:1]) for cycle in self.cycles],
+        })
+
+def find_cycles(manager: List[int]) -> List[List[int]]:
+    """
+    Finds every reporting loop in a manager array in O(n).
+
+    Each node has at most one manager, so the graph is functional: walking the manager
+    chain from each unvisited node either ends at a root, reaches a node finished by an
+    earlier walk, or returns to a node of the current walk, which closes a loop.
+
+    Args:
+        manager (List[int]): The manager node index for each node, -1 when none
+
+    Returns:
+        List[List[int]]: The nodes of each loop in reporting order
+    """
+    state: List[int] = [0] * len(manager) # 0 unvisited, 1 on the current walk, 2 finished
+    cycles: List[List[int]] = []
+
+    for start in range(len(manager)):
+        if state[start]:
+            continue
+        path: List[int] = []
+        node: int = start
+        while node >= 0 and state[node] == 0:
+            state[node] = 1
+            path.append(node)
+            node = manager[node]
+        if node >= 0 and state[node] == 1:
+            cycles.append(path[path.index(node):])
+        for visited in path:
+            state[visited] = 2
+
+    return cycles
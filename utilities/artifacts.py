@@ -0,0 +1,137 @@
+"""
+Copyright (c) 2024-2025, All rights reserved, Use subject to license terms.
+Scott Fehrman, scott.fehrman@sailpoint.com
+"""
+
+import os
+import pickle
+import re
+import shutil
+import tempfile
+import time
+from typing import Any, Callable, Hashable, List, Optional
+from utilities.cache import stage_cache
+
+CURRENT: str = "CURRENT"
+HEARTBEAT: str = "HEARTBEAT"
+REFRESH: str = "REFRESH"
+STAGING: str = ".staging-"
+
+class ArtifactStore:
+    """
+    Versioned stage results shared between the precompute worker and the app.
+
+    Each dataset version is a directory with one pickle per stage result, named after
+    the stage and its parameters (the same key as utilities.cache). The worker writes
+    a version into a staging directory, renames it into place and then swaps the
+    CURRENT pointer with os.replace, so readers always see a complete version.
+    """
+    root: str
+    keep: int
+
+    def __init__(self, root: str = 'artifacts', keep: int = 3):
+        """
+        Initialize the ArtifactStore.
+
+        Args:
+            root (str): The directory holding the versions
+            keep (int): The number of published versions kept on disk
+        """
+
+        self.root = root
+        self.keep = keep
+        os.makedirs(root, exist_ok=True)
+
+    def current(self) -> Optional[str]:
+        """Returns the latest published version, None before the first publish."""
+        try:
+            with open(os.path.join(self.root, CURRENT)) as file:
+                return file.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def is_live(self, max_age: float) -> bool:
+        """Returns True when a worker has reported within max_age seconds."""
+        try:
+            return time.time() - os.path.getmtime(os.path.join(self.root, HEARTBEAT)) < max_age
+        except FileNotFoundError:
+            return False
+
+    def heartbeat(self) -> None:
+        """Records that the worker is alive."""
+        with open(os.path.join(self.root, HEARTBEAT), "w") as file:
+            file.write(str(time.time()))
+
+    def request_refresh(self) -> None:
+        """Asks the worker to reload the identities from the tenant."""
+        with open(os.path.join(self.root, REFRESH), "w") as file:
+            file.write(str(time.time()))
+
+    def refresh_requested(self) -> bool:
+        """Returns True while a reload request is waiting for the worker."""
+        return os.path.exists(os.path.join(self.root, REFRESH))
+
+    def take_refresh_request(self) -> bool:
+        """Consumes a pending reload request, returns True when there was one."""
+        try:
+            os.remove(os.path.join(self.root, REFRESH))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def path(self, directory: str, stage: str, *params: Hashable) -> str:
+        """Returns the file of a stage result, parameters become part of the file name."""
+        name = "-".join([stage, *(str(param) for param in params)])
+        return os.path.join(directory, re.sub(r"[^A-Za-z0-9_.-]", "_", name) + ".pkl")
+
+    def staging(self, version: str) -> str:
+        """Returns a new, empty staging directory for a version."""
+        return tempfile.mkdtemp(prefix=f"{STAGING}{version}-", dir=self.root)
+
+    def write(self, directory: str, stage: str, value: Any, *params: Hashable) -> None:
+        """Writes a stage result into a staging directory."""
+        with open(self.path(directory, stage, *params), "wb") as file:
+            pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def publish(self, version: str, staging: str) -> None:
+        """Moves a complete staging directory into place, points CURRENT at it and prunes old versions."""
+        target = os.path.join(self.root, version)
+        if os.path.isdir(target): # published before, e.g. by a previous run of the worker
+            shutil.rmtree(staging)
+        else:
+            os.replace(staging, target)
+
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix=f".{CURRENT}-")
+        with os.fdopen(fd, "w") as file:
+            file.write(version)
+        os.replace(tmp, os.path.join(self.root, CURRENT))
+        self._prune(version)
+
+    def discard(self, staging: str) -> None:
+        """Deletes a staging directory whose build failed."""
+        shutil.rmtree(staging, ignore_errors=True)
+
+    def _prune(self, current: str) -> None:
+        """Deletes all but the newest `keep` versions, never the current one."""
+        versions: List[str] = [entry.name for entry in os.scandir(self.root) if entry.is_dir() and not entry.name.startswith(".")]
+        versions.sort(key=lambda name: os.path.getmtime(os.path.join(self.root, name)), reverse=True)
+        for name in versions[self.keep:]:
+            if name != current:
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+
+    def load(self, stage: str, version: str, compute: Callable[[], Any], *params: Hashable) -> Any:
+        """Returns a stage result from the published version, computed when no artifact exists; not cached."""
+        try:
+            with open(self.path(os.path.join(self.root, version), stage, *params), "rb") as file:
+                return pickle.load(file)
+        except FileNotFoundError: # pruned or never built
+            return compute()
+
+    def get_or_compute(self, stage: str, version: str, compute: Callable[[], Any], *params: Hashable) -> Any:
+        """
+        Returns a stage result, from the published version when the worker has built it.
+
+        Drop-in for stage_cache.get_or_compute: the result is loaded (or computed when no
+        artifact exists) once per process and then served from the stage cache.
+        """
+        return stage_cache.get_or_compute(stage, version, lambda: self.load(stage, version, compute, *params), *params)
@@ -0,0 +1,181 @@
+"""
+Copyright (c) 2024-2025, All rights reserved, Use subject to license terms.
+Scott Fehrman, scott.fehrman@sailpoint.com
+"""
+
+import sys
+import threading
+import time
+import pandas as pd
+from collections import OrderedDict
+from itertools import islice
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Tuple
+from utilities.tracing import span
+
+class StageStats:
+    """
+    Hit / miss counters for one pipeline stage.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.compute_seconds = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0, "compute_seconds": round(self.compute_seconds, 3)}
+
+class StageCache:
+    """
+    Process wide, memory bounded cache for the results of the app.main pipeline stages.
+
+    Results are keyed by stage name, dataset version and any stage parameters. Streamlit
+    runs every session in the same process, so all sessions share the cache and a
+    dataset version is processed once no matter how many users view it. Concurrent
+    requests for a missing key wait for the first one to compute it. Entries are
+    evicted least recently used first once the entry count or the estimated size
+    exceeds the limits.
+    """
+    max_entries: int
+    max_bytes: int
+
+    def __init__(self, max_entries: int = 64, max_bytes: int = 1024 * 2**20):
+        """
+        Initialize the StageCache.
+
+        Args:
+            max_entries (int): The maximum number of cached results
+            max_bytes (int): The maximum estimated size of all cached results
+        """
+
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[Hashable, ...], Tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._stats: Dict[str, StageStats] = {}
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple[Hashable, ...], threading.Lock] = {}
+
+    def get_or_compute(self, stage: str, version: str, compute: Callable[[], Any], *params: Hashable) -> Any:
+        """
+        Returns the cached result of a stage, computing it on a miss.
+
+        Args:
+            stage (str): The stage name, e.g. "frame"
+            version (str): The dataset version the result depends on
+            compute (Callable[[], Any]): Computes the result
+            params (Hashable): Further parameters the result depends on
+
+        Returns:
+            Any: The cached or computed result
+        """
+        key: Tuple[Hashable, ...] = (stage, version, *params)
+
+        while True:
+            with self._lock:
+                stats = self._stats.setdefault(stage, StageStats())
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    stats.hits += 1
+                    return self._entries[key][0]
+                pending = self._pending.get(key)
+                if pending is None:
+                    pending = self._pending[key] = threading.Lock()
+                    pending.acquire()
+                    stats.misses += 1
+                    break
+            with pending: # another session is computing the same key, wait for it and look again
+                pass
+
+        try:
+            start = time.perf_counter()
+            with span(f"stage:{stage}") as record:
+                value = compute()
+            elapsed = time.perf_counter() - start
+            size = _estimate_bytes(value)
+            if record is not None:
+                record["inputs"]["result_bytes"] = size
+            with self._lock:
+                stats.compute_seconds += elapsed
+                self._entries[key] = (value, size)
+                self._bytes += size
+                self._evict()
+            return value
+        finally:
+            with self._lock:
+                del self._pending[key]
+            pending.release()
+
+    def _evict(self) -> None:
+        """Drops least recently used entries until the cache is within its limits (lock held)."""
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            (stage, *_), (_, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self._stats.setdefault(stage, StageStats()).evictions += 1
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Returns the hit / miss statistics per stage."""
+        with self._lock:
+            return {stage: stats.to_dict() for stage, stats in self._stats.items()}
+
+    def size(self) -> Tuple[int, int]:
+        """Returns the number of entries and their estimated size in bytes."""
+        with self._lock:
+            return len(self._entries), self._bytes
+
+    def clear(self) -> None:
+        """Drops every entry, the statistics are kept."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+SAMPLE: int = 32 # elements measured per container, the size of the others is extrapolated
+MAX_DEPTH: int = 8
+
+def _estimate_bytes(value: Any, depth: int = 0, seen: Optional[Set[int]] = None) -> int:
+    """
+    A deep size estimate, sampled for large containers.
+
+    Objects that report their own size (an int nbytes, e.g. numpy arrays, StringTable and
+    IdentityStore) are trusted, DataFrames are measured including their strings, and
+    containers and object attributes (pydantic models, OrgHierarchy, pydeck layers) are
+    followed recursively. A container is measured on up to SAMPLE evenly spaced elements.
+    """
+    if seen is None:
+        seen = set()
+    if id(value) in seen or depth > MAX_DEPTH:
+        return 0
+    seen.add(id(value))
+
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    nbytes = getattr(value, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+    if isinstance(value, (str, bytes, bytearray, int, float, bool, type(None))):
+        return sys.getsizeof(value)
+
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        elements: List[Any] = [element for item in islice(value.items(), SAMPLE) for element in item]
+        count = 2 * len(value)
+    elif isinstance(value, (list, tuple)):
+        elements = list(value[::max(1, len(value) // SAMPLE)][:SAMPLE])
+        count = len(value)
+    elif isinstance(value, (set, frozenset)):
+        elements = list(islice(value, SAMPLE))
+        count = len(value)
+    else:
+        elements = list(getattr(value, "__dict__", {}).values())
+        count = len(elements)
+    if elements:
+        sampled = sum(_estimate_bytes(element, depth + 1, seen) for element in elements)
+        size += sampled * count // len(elements)
+    return size
+
+stage_cache = StageCache()
@@ -5,8 +5,11 @@ Scott Fehrman, scott.fehrman@sailpoint.com
 
 import pandas as pd
 import plotly.express as px
+from typing import Optional
 from plotly.graph_objects import Figure
+from utilities.tracing import traced
 
+@traced()
 def get_pie(df: pd.DataFrame, values: str, names: str, hole: float = 0.3) -> Figure:
     """
     Creates a pie chart visualization of the data in the DataFrame.
@@ -20,20 +23,21 @@ def get_pie(df: pd.DataFrame, values: str, names: str, hole: float = 0.3) -> Fig
     fig = px.pie(df, values=values, names=names, hole=hole)
     return fig
 
-def get_heatmap(df: pd.DataFrame, x_attr: str, y_attr: str, data_attr: str, x_lbl: str, y_lbl: str, data_lbl: str) -> Figure:
+@traced()
+def get_heatmap(counts: pd.DataFrame, x_attr: str, y_attr: str, data_attr: str, x_lbl: str, y_lbl: str, data_lbl: str) -> Figure:
     """
     Creates a heatmap visualization of the data in the DataFrame.
     
     This function generates a heatmap using Plotly Express, which is a popular library
     for creating interactive and customizable charts in Python. The heatmap displays
     the density of data points in a two-dimensional space defined by the x and y attributes.
+    The counts are pre-aggregated, one row per (x, y) pair, see IdentityCube.pairs().
     """
 
     fig: Figure
-    heatmap_data: pd.DataFrame = df.groupby([x_attr, y_attr]).size().reset_index(name=data_attr)
     
     fig = px.density_heatmap(
-        heatmap_data, 
+        counts, 
         x=x_attr, 
         y=y_attr, 
         z=data_attr,
@@ -47,20 +51,21 @@ def get_heatmap(df: pd.DataFrame, x_attr: str, y_attr: str, data_attr: str, x_lb
     return fig
 
 
-def get_scatter(df: pd.DataFrame, x_attr: str, y_attr: str, data_attr: str, x_lbl: str, y_lbl: str, data_lbl: str) -> Figure:
+@traced()
+def get_scatter(counts: pd.DataFrame, x_attr: str, y_attr: str, data_attr: str, x_lbl: str, y_lbl: str, data_lbl: str) -> Figure:
     """
     Creates a scatter plot visualization of the data in the DataFrame.
     
     This function generates a scatter plot using Plotly Express, which is a popular library
     for creating interactive and customizable charts in Python. The scatter plot displays
     the relationship between two attributes in the DataFrame.
+    Takes the same pre-aggregated pair counts as get_heatmap.
     """
 
     fig: Figure
-    scatter_data: pd.DataFrame = df.groupby([x_attr, y_attr]).size().reset_index(name=data_attr)
     
     fig = px.scatter(
-        scatter_data,
+        counts,
         x=x_attr,
         y=y_attr,
         size=data_attr,
@@ -75,21 +80,21 @@ def get_scatter(df: pd.DataFrame, x_attr: str, y_attr: str, data_attr: str, x_lb
     )
     return fig
 
-def get_scatter_3d(df: pd.DataFrame, x_attr: str, y_attr: str, data_attr: str, x_lbl: str, y_lbl: str, data_lbl: str) -> Figure:
+@traced()
+def get_scatter_3d(counts: pd.DataFrame, x_attr: str, y_attr: str, data_attr: str, x_lbl: str, y_lbl: str, data_lbl: str) -> Figure:
     """
     Creates a 3D scatter plot visualization of the data in the DataFrame.
     
     This function generates a 3D scatter plot using Plotly Express, which is a popular library
     for creating interactive and customizable charts in Python. The 3D scatter plot displays
     the relationship between three attributes in the DataFrame.
+    Takes the same pre-aggregated pair counts as get_heatmap.
     """
     
     fig: Figure
 
-    scatter_3d_data: pd.DataFrame = df.groupby([x_attr, y_attr]).size().reset_index(name=data_attr)
-    
     fig = px.scatter_3d(
-        scatter_3d_data,
+        counts,
         x=x_attr,
         y=y_attr,
         z=data_attr,
@@ -106,3 +111,38 @@ def get_scatter_3d(df: pd.DataFrame, x_attr: str, y_attr: str, data_attr: str, x
     )
 
     return fig
+
+@traced()
+def get_bar(df: pd.DataFrame, x_attr: str, y_attr: str, x_lbl: str, y_lbl: str, color_attr: Optional[str] = None) -> Figure:
+    """
+    Creates a bar chart visualization of the data in the DataFrame.
+
+    This function generates a bar chart using Plotly Express. Each row of the DataFrame
+    is one bar, the values are not aggregated.
+    """
+
+    fig: Figure
+    fig = px.bar(
+        df,
+        x=x_attr,
+        y=y_attr,
+        color=color_attr,
+        labels={
+            x_attr: x_lbl,
+            y_attr: y_lbl
+        }
+    )
+    return fig
+
+@traced()
+def get_histogram(df: pd.DataFrame, x_attr: str, x_lbl: str, nbins: Optional[int] = None, log_y: bool = False) -> Figure:
+    """
+    Creates a histogram visualization of one attribute in the DataFrame.
+
+    This function generates a histogram using Plotly Express, counting the rows that
+    fall into each bin of the attribute.
+    """
+
+    fig: Figure
+    fig = px.histogram(df, x=x_attr, nbins=nbins, log_y=log_y, labels={x_attr: x_lbl})
+    return fig
@@ -0,0 +1,101 @@
+"""
+Copyright (c) 2024-2025, All rights reserved, Use subject to license terms.
+Scott Fehrman, scott.fehrman@sailpoint.com
+"""
+
+import numpy as np
+import pandas as pd
+import utilities.constants as CONSTANTS
+from typing import List
+from utilities.hierarchy import OrgHierarchy
+
+SUBTREE: str = "subtree"
+CLUSTER_MODES: List[str] = [CONSTANTS.DEPARTMENT, CONSTANTS.LOCATION, SUBTREE]
+OTHER: str = "Other"
+
+class GraphSummary:
+    """
+    The reports-to graph collapsed into supernodes.
+
+    Every identity is assigned to one group (a department, a location or a manager
+    subtree). Groups smaller than the threshold are combined into "Other". The
+    reporting links between identities of different groups are aggregated into
+    weighted edges, so the number of rendered elements depends on the number of
+    groups and not on the size of the tenant.
+    """
+    labels: List[str] # group label per group index
+    sizes: List[int] # members per group
+    group: np.ndarray # group index per node index
+    edges: pd.DataFrame # source, target (group indexes) and weight (number of reporting links)
+
+    def __init__(self, df: pd.DataFrame, hierarchy: OrgHierarchy, by: str, threshold: int = 50):
+        """
+        Initialize the GraphSummary.
+
+        Args:
+            df (pd.DataFrame): The identity frame (see utilities.frames)
+            hierarchy (OrgHierarchy): The hierarchy built from the same frame
+            by (str): CONSTANTS.DEPARTMENT, CONSTANTS.LOCATION or SUBTREE
+            threshold (int): The minimum number of members of a supernode
+        """
+
+        if by == SUBTREE:
+            keys = _subtree_clusters(hierarchy, threshold)
+            names = df[CONSTANTS.NAME].astype("object").to_numpy()
+            key_labels = {key: f"{names[key]} org" for key in np.unique(keys)}
+        else:
+            values = df[by].astype("object").fillna("Unknown").to_numpy()
+            codes, uniques = pd.factorize(values)
+            keys = codes
+            key_labels = {code: str(value) for code, value in enumerate(uniques)}
+
+        # combine the small groups into "Other"
+        unique_keys, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        large = counts >= threshold
+        order = np.argsort(-counts, kind="stable")
+        self.labels = [key_labels[unique_keys[i]] for i in order if large[i]]
+        remap = np.full(len(unique_keys), len(self.labels), dtype=np.int32) # small groups -> "Other"
+        remap[order[large[order]]] = np.arange(len(self.labels), dtype=np.int32)
+        if not large.all():
+            self.labels.append(OTHER)
+        self.group = remap[inverse]
+        self.sizes = np.bincount(self.group, minlength=len(self.labels)).tolist()
+
+        # aggregate the reporting links between groups
+        parent = np.asarray(hierarchy.parent, dtype=np.int64)
+        has_manager = parent >= 0
+        links = pd.DataFrame({"source": self.group[has_manager], "target": self.group[parent[has_manager]]})
+        links = links[links["source"] != links["target"]]
+        self.edges = links.groupby(["source", "target"]).size().reset_index(name="weight")
+
+    def members(self, group: int) -> np.ndarray:
+        """Returns the node indexes of the members of a group."""
+        return np.flatnonzero(self.group == group)
+
+def _subtree_clusters(hierarchy: OrgHierarchy, threshold: int) -> np.ndarray:
+    """
+    Cuts the forest into manager subtrees of at least threshold identities.
+
+    Walking bottom up, a manager becomes a cluster head once the identities below it
+    that are not yet claimed by a deeper head reach the threshold; roots are always
+    heads. Each identity belongs to its nearest head, itself included.
+
+    Returns:
+        np.ndarray: The node index of the cluster head for each node
+    """
+    pending: List[int] = [1] * len(hierarchy) # unclaimed identities in the subtree, the node included
+    head_of: List[int] = [-1] * len(hierarchy)
+    is_head: List[bool] = [False] * len(hierarchy)
+
+    for node in reversed(hierarchy.order):
+        manager = hierarchy.parent[node]
+        if manager < 0 or pending[node] >= threshold:
+            is_head[node] = True
+        else:
+            pending[manager] += pending[node]
+
+    for node in hierarchy.order: # managers come before their reports
+        manager = hierarchy.parent[node]
+        head_of[node] = node if is_head[node] else head_of[manager]
+
+    return np.asarray(head_of, dtype=np.int64)
@@ -0,0 +1,277 @@
+"""
+Copyright (c) 2024-2025, All rights reserved, Use subject to license terms.
+Scott Fehrman, scott.fehrman@sailpoint.com
+"""
+
+import asyncio
+import random
+import time
+import aiohttp
+import pandas as pd
+import utilities.constants as CONSTANTS
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+ACCOUNTS: str = "accounts"
+ACCESS_PROFILES: str = "access_profiles"
+ROLES: str = "roles"
+ENTITLEMENTS: str = "entitlements"
+ACCESS_ITEMS: str = "access_items"
+
+COLLECTIONS: Dict[str, str] = {
+    ACCOUNTS: "/v2025/accounts",
+    ACCESS_PROFILES: "/v2025/access-profiles",
+    ROLES: "/v2025/roles",
+    ENTITLEMENTS: "/v2025/entitlements",
+}
+ACCESS_ITEMS_PATH: str = "/v2025/identities/{identity_id}/access-items"
+ACCESS_TYPES: Dict[str, str] = {"accessProfile": ACCESS_PROFILES, "role": ROLES, "entitlement": ENTITLEMENTS, "account": ACCOUNTS}
+RETRY_STATUS: Tuple[int, ...] = (429, 502, 503, 504)
+
+class AsyncCollector:
+    """
+    Collects several SailPoint collections concurrently with asyncio.
+
+    Every HTTP request, whatever the collection, acquires one global semaphore, so the
+    tenant never sees more than `concurrency` requests in flight. A collection reads
+    its first page with count=true and then requests the remaining offsets
+    concurrently; without a total count it pages sequentially until a short page.
+    Throttled requests (429, 503, ...) are retried with the Retry-After header or
+    exponential backoff with jitter, like utilities.loader.IdentityLoader.
+    """
+    base_url: str
+    token: Optional[str]
+    concurrency: int
+    page_size: int
+    max_retries: int
+    backoff: float
+    max_backoff: float
+    timeout: float
+
+    def __init__(self, base_url: str, token: Optional[str] = None, concurrency: int = 16, page_size: int = 250,
+                 max_retries: int = 8, backoff: float = 0.5, max_backoff: float = 30.0, timeout: float = 60.0):
+        """
+        Initialize the AsyncCollector.
+
+        Args:
+            base_url (str): The tenant API base URL, e.g. SPTKService.config.base_url
+            token (Optional[str]): The OAuth access token, sent as a bearer token
+            concurrency (int): The maximum number of requests in flight across all collections
+            page_size (int): The number of records per page (the API maximum is 250)
+            max_retries (int): Retries per request on throttling or a temporary error
+            backoff (float): The initial backoff in seconds
+            max_backoff (float): The maximum backoff in seconds
+            timeout (float): The total timeout of a single request in seconds
+        """
+
+        self.base_url = base_url.rstrip("/")
+        self.token = token
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.requests: int = 0
+
+    async def _get(self, session: aiohttp.ClientSession, semaphore: asyncio.Semaphore, path: str,
+                   params: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """Returns one page of records and the X-Total-Count header when present."""
+        delay: float = self.backoff
+        for attempt in range(self.max_retries + 1):
+            async with semaphore:
+                self.requests += 1
+                async with session.get(self.base_url + path, params=params) as response:
+                    if response.status not in RETRY_STATUS or attempt == self.max_retries:
+                        response.raise_for_status()
+                        total = response.headers.get("X-Total-Count")
+                        return await response.json(), int(total) if total else None
+                    retry_after = response.headers.get("Retry-After")
+            wait = float(retry_after) if retry_after and retry_after.isdigit() else min(delay, self.max_backoff) * (0.5 + random.random())
+            delay *= 2
+            await asyncio.sleep(wait)
+        raise RuntimeError("unreachable")
+
+    async def _collection(self, session: aiohttp.ClientSession, semaphore: asyncio.Semaphore, path: str,
+                          params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Returns every record of a collection."""
+        params = dict(params or {}, limit=self.page_size)
+        records, total = await self._get(session, semaphore, path, dict(params, offset=0, count="true"))
+        if len(records) < self.page_size:
+            return records
+
+        if total is not None: # the remaining pages are known, request them concurrently
+            pages = await asyncio.gather(*(self._get(session, semaphore, path, dict(params, offset=offset))
+                                           for offset in range(self.page_size, total, self.page_size)))
+            for page, _ in pages:
+                records.extend(page)
+            return records
+
+        offset: int = len(records)
+        while True:
+            page, _ = await self._get(session, semaphore, path, dict(params, offset=offset))
+            records.extend(page)
+            offset += len(page)
+            if len(page) < self.page_size:
+                return records
+
+    async def _access_items(self, session: aiohttp.ClientSession, semaphore: asyncio.Semaphore, identity_id: str) -> List[Dict[str, Any]]:
+        """Returns the access items of one identity, tagged with the identity id."""
+        items = await self._collection(session, semaphore, ACCESS_ITEMS_PATH.format(identity_id=identity_id))
+        for item in items:
+            item["identityId"] = identity_id
+        return items
+
+    async def collect_async(self, collections: Iterable[str] = tuple(COLLECTIONS), identity_ids: Iterable[str] = ()) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Fetches the collections and the access items of the identities concurrently.
+
+        Args:
+            collections (Iterable[str]): Keys of COLLECTIONS to fetch
+            identity_ids (Iterable[str]): Identities whose access items are fetched, one request chain each
+
+        Returns:
+            Dict[str, List[Dict[str, Any]]]: The records per collection, access items under ACCESS_ITEMS
+        """
+        names: List[str] = list(collections)
+        ids: List[str] = list(identity_ids)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        headers = {"Accept": "application/json", "X-SailPoint-Experimental": "true"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+
+        async with aiohttp.ClientSession(headers=headers, connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout)) as session:
+            results = await asyncio.gather(
+                *(self._collection(session, semaphore, COLLECTIONS[name]) for name in names),
+                *(self._access_items(session, semaphore, identity_id) for identity_id in ids))
+
+        collected: Dict[str, List[Dict[str, Any]]] = dict(zip(names, results[:len(names)]))
+        if ids:
+            collected[ACCESS_ITEMS] = [item for items in results[len(names):] for item in items]
+        return collected
+
+    def collect(self, collections: Iterable[str] = tuple(COLLECTIONS), identity_ids: Iterable[str] = ()) -> Dict[str, List[Dict[str, Any]]]:
+        """Runs collect_async in a new event loop, for callers without one (e.g. Streamlit)."""
+        return asyncio.run(self.collect_async(collections, identity_ids))
+
+def get_access_frame(collected: Dict[str, List[Dict[str, Any]]]) -> pd.DataFrame:
+    """
+    Returns one row per identity and access: id, access_type, access_id and access_name.
+
+    The per identity access items are used when they were collected, otherwise only the
+    accounts are known (joined by their identityId). Names are resolved from the
+    access profile, role and entitlement catalogs by id.
+    """
+    catalogs: Dict[str, Dict[str, str]] = {name: {record["id"]: record.get("name") for record in collected.get(name, [])}
+                                           for name in (ACCESS_PROFILES, ROLES, ENTITLEMENTS)}
+    rows: List[Tuple[str, str, str, Optional[str]]] = []
+
+    if ACCESS_ITEMS in collected:
+        for item in collected[ACCESS_ITEMS]:
+            access_type = ACCESS_TYPES.get(item.get("accessType", ""), item.get("accessType"))
+            name = catalogs.get(access_type, {}).get(item.get("id")) or item.get("displayName") or item.get("name")
+            rows.append((item["identityId"], access_type, item.get("id"), name))
+    else:
+        for account in collected.get(ACCOUNTS, []):
+            if account.get("identityId"):
+                rows.append((account["identityId"], ACCOUNTS, account.get("id"), account.get("name")))
+
+    return pd.DataFrame(rows, columns=[CONSTANTS.ID, "access_type", "access_id", "access_name"]).astype(
+        {"access_type": "category"})
+
+def join_access(df: pd.DataFrame, access: pd.DataFrame) -> pd.DataFrame:
+    """
+    Joins the number of accounts, access profiles, roles and entitlements per identity to the identity frame.
+
+    Args:
+        df (pd.DataFrame): The identity frame (see utilities.frames)
+        access (pd.DataFrame): The access rows from get_access_frame
+
+    Returns:
+        pd.DataFrame: The identity frame with one int32 count column per access type
+    """
+    counts = access.groupby([CONSTANTS.ID, "access_type"], observed=True).size().unstack(fill_value=0)
+    counts.columns = counts.columns.astype(str)
+    counts = counts.reindex(columns=[ACCOUNTS, ACCESS_PROFILES, ROLES, ENTITLEMENTS], fill_value=0)
+    joined = df.merge(counts, left_on=CONSTANTS.ID, right_index=True, how="left")
+    return joined.fillna({column: 0 for column in counts.columns}).astype({column: "int32" for column in counts.columns})
+
+async def _serve_mock(identities: int, per_identity: int, throttle_every: int) -> Tuple[Any, str, Dict[str, int]]:
+    """
+    Starts a local mock of the SailPoint collection endpoints on a free port.
+
+    Collections support offset, limit and count=true, every throttle_every-th request
+    answers 429 with Retry-After: 0, and the peak number of requests in flight is tracked.
+    """
+    from aiohttp import web
+
+    catalog = {
+        ACCESS_PROFILES: [{"id": f"ap{i}", "name": f"Access Profile {i}"} for i in range(40)],
+        ROLES: [{"id": f"role{i}", "name": f"Role {i}"} for i in range(15)],
+        ENTITLEMENTS: [{"id": f"ent{i}", "name": f"Entitlement {i}"} for i in range(600)],
+        ACCOUNTS: [{"id": f"acct{i}", "name": f"account{i}", "identityId": f"id{i % identities}"} for i in range(identities * 2)],
+    }
+    state: Dict[str, int] = {"requests": 0, "in_flight": 0, "peak": 0}
+
+    def page(records: List[Dict[str, Any]], request: Any) -> Any:
+        offset = int(request.query.get("offset", 0))
+        limit = int(request.query.get("limit", 250))
+        headers = {"X-Total-Count": str(len(records))} if request.query.get("count") == "true" else {}
+        return web.json_response(records[offset:offset + limit], headers=headers)
+
+    async def handle(request: Any) -> Any:
+        state["requests"] += 1
+        state["in_flight"] += 1
+        state["peak"] = max(state["peak"], state["in_flight"])
+        try:
+            await asyncio.sleep(0.01)
+            if throttle_every and state["requests"] % throttle_every == 0:
+                return web.Response(status=429, headers={"Retry-After": "0"})
+            if "identity_id" in request.match_info:
+                number = int(request.match_info["identity_id"][2:])
+                items = [{"id": f"ent{(number + i) % 600}", "accessType": "entitlement", "displayName": f"Entitlement {(number + i) % 600}"} for i in range(per_identity)]
+                items.append({"id": f"role{number % 15}", "accessType": "role"})
+                return page(items, request)
+            return page(catalog[request.match_info["name"].replace("-", "_")], request)
+        finally:
+            state["in_flight"] -= 1
+
+    app = web.Application()
+    app.router.add_get("/v2025/identities/{identity_id}/access-items", handle)
+    app.router.add_get("/v2025/{name}", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1] # type: ignore
+    return runner, f"http://127.0.0.1:{port}", state
+
+def test_async_collector():
+    """
+    Test the AsyncCollector against a local mock HTTP server, compares serial and concurrent collection.
+    """
+    async def run(concurrency: int) -> Tuple[Dict[str, List[Dict[str, Any]]], Dict[str, int], float]:
+        runner, base_url, state = await _serve_mock(identities=300, per_identity=3, throttle_every=25)
+        try:
+            collector = AsyncCollector(base_url, token="test", concurrency=concurrency, backoff=0.01)
+            start = time.perf_counter()
+            collected = await collector.collect_async(identity_ids=[f"id{i}" for i in range(300)])
+            return collected, state, time.perf_counter() - start
+        finally:
+            await runner.cleanup()
+
+    for concurrency in (1, 16):
+        collected, state, elapsed = asyncio.run(run(concurrency))
+        assert len(collected[ACCOUNTS]) == 600 and len(collected[ENTITLEMENTS]) == 600
+        assert len(collected[ACCESS_ITEMS]) == 300 * 4
+        assert state["peak"] <= concurrency, state
+        print(f"concurrency={concurrency}: {state['requests']} requests in {elapsed:.2f}s (peak {state['peak']} in flight)")
+
+    access = get_access_frame(collected)
+    assert access[access["access_type"] == ROLES]["access_name"].notna().all() # names joined from the role catalog
+    df = pd.DataFrame({CONSTANTS.ID: [f"id{i}" for i in range(301)]})
+    joined = join_access(df, access)
+    assert joined[ENTITLEMENTS].iloc[0] == 3 and joined[ROLES].iloc[0] == 1 and joined[ROLES].iloc[300] == 0
+
+if __name__ == "__main__":
+    test_async_collector()
@@ -7,6 +7,13 @@ TITLE: str = "title"
 DEPARTMENT: str = "department"
 LOCATION: str = "location"
 
+# identity frame columns (title, department and location use the attribute names above)
+ID: str = "id"
+NAME: str = "name"
+IS_MANAGER: str = "is_manager"
+MANAGER_ID: str = "manager_id"
+HAS_ATTRIBUTES: str = "has_attributes"
+
 SPTK_WHITEBG_COLORS = [ # Web safe colors that look good on a white background
     "#C71585", # MediumVioletRed
     "#483D8B", # DarkSlateBlue
@@ -1,29 +1,89 @@
 import csv
 import os
-from typing import Dict, Tuple
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
 from geopy.geocoders import Nominatim
 from geopy.location import Location
+from utilities.tracing import span, traced
 
-class CoordinatesManager:
+ALIASES: Dict[str, str] = { # normalized alias -> normalized city
+    "nyc": "new york",
+    "new york city": "new york",
+    "sf": "san francisco",
+    "la": "los angeles",
+    "washington dc": "washington",
+    "washington, d.c.": "washington",
+}
+
+class CoordinatesNotFound(ValueError):
+    """Raised when the geocoding service has no coordinates for a city."""
+
+def normalize_city(city: Any, aliases: Dict[str, str] = ALIASES) -> str:
+    """Returns the lookup key for a city: case folded, whitespace collapsed, aliases resolved."""
+    key: str = " ".join(f"{city}".split()).casefold()
+    return aliases.get(key, key)
+
+class RateLimiter:
     """
-    Manages city coordinates by reading from and writing to a CSV file.
-    
-    This class provides functionality to read city coordinates from a CSV file,
-    store them in a dictionary, and write the data back to the file when changes are made.
+    Spaces out calls from any number of threads by a minimum interval.
     """
-    data: Dict[str, Tuple[float, float]]
 
-    def __init__(self, csv_file='coordinates.csv'):
-        """
-        Initialize the CityCoordinatesManager with a CSV file for storing city coordinates.
-        
-        Args:
-            csv_file (str): The path to the CSV file containing city coordinates.
-        """
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self) -> None:
+        """Blocks until the caller is allowed to make the next call."""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.min_interval
+        if start > now:
+            time.sleep(start - now)
+
+class CoordinatesStore:
+    """
+    Interface for the persistent storage behind the CoordinatesManager.
+
+    Keys are lower case city names, values are (latitude, longitude) tuples.
+    """
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Tuple[float, float]]:
+        """Returns the stored coordinates for the keys that are present."""
+        raise NotImplementedError
+
+    def put_many(self, items: Dict[str, Tuple[float, float]]) -> None:
+        """Stores new coordinates."""
+        raise NotImplementedError
+
+    def get_misses(self, keys: Iterable[str]) -> Dict[str, float]:
+        """Returns the expiry time (epoch seconds) of the cached misses among the keys."""
+        raise NotImplementedError
+
+    def put_misses(self, items: Dict[str, float]) -> None:
+        """Stores misses with their expiry time (epoch seconds)."""
+        raise NotImplementedError
+
+class CsvCoordinatesStore(CoordinatesStore):
+    """
+    Stores coordinates in a CSV file that is loaded completely into memory.
 
+    Every update rewrites the file, so it is only suitable for small, single process use.
+    Misses are only kept in memory.
+    """
+    data: Dict[str, Tuple[float, float]]
+    misses: Dict[str, float]
+
+    def __init__(self, csv_file: str = 'coordinates.csv'):
         self.csv_file = csv_file
         self.data = {}
-        self.geolocator = Nominatim(user_agent="city_coordinates_manager")
+        self.misses = {}
+        self._lock = threading.Lock()
         self._read_csv()
 
     def _read_csv(self):
@@ -36,47 +96,261 @@ class CoordinatesManager:
                     self.data[city_key] = (float(row['latitude']), float(row['longitude']))
 
     def _write_csv(self):
-        """Write the current data dictionary back to the CSV file."""
-        with open(self.csv_file, mode='w', newline='') as file:
-            writer = csv.DictWriter(file, fieldnames=['city','latitude','longitude'])
-            writer.writeheader()
-            for key, (latitude, longitude) in self.data.items():
-                city = key
-                writer.writerow({'city': city, 'latitude': latitude, 'longitude': longitude})
+        """
+        Write the current data dictionary back to the CSV file.
+
+        The data is written to a temporary file that replaces the CSV file in one step,
+        so readers never see a partially written file.
+        """
+        directory = os.path.dirname(os.path.abspath(self.csv_file))
+        fd, tmp_file = tempfile.mkstemp(prefix=".coordinates.", suffix=".csv", dir=directory)
+        try:
+            with os.fdopen(fd, mode='w', newline='') as file:
+                writer = csv.DictWriter(file, fieldnames=['city','latitude','longitude'])
+                writer.writeheader()
+                for key, (latitude, longitude) in self.data.items():
+                    city = key
+                    writer.writerow({'city': city, 'latitude': latitude, 'longitude': longitude})
+            os.replace(tmp_file, self.csv_file)
+        except BaseException:
+            os.unlink(tmp_file)
+            raise
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Tuple[float, float]]:
+        return {key: self.data[key] for key in keys if key in self.data}
+
+    def put_many(self, items: Dict[str, Tuple[float, float]]) -> None:
+        with self._lock:
+            self.data.update(items)
+            self._write_csv()
+
+    def get_misses(self, keys: Iterable[str]) -> Dict[str, float]:
+        return {key: self.misses[key] for key in keys if key in self.misses}
+
+    def put_misses(self, items: Dict[str, float]) -> None:
+        self.misses.update(items)
+
+class SqliteCoordinatesStore(CoordinatesStore):
+    """
+    Stores coordinates in an SQLite database indexed by city.
+
+    A lookup is an indexed read instead of a CSV parse, new cities are inserted instead
+    of rewriting the file, and SQLite's locking (WAL mode) makes it safe for several
+    processes to read and write the same database. An empty database is seeded from
+    the CSV file.
+    """
+
+    def __init__(self, db_file: str = 'coordinates.db', seed_csv: Optional[str] = 'coordinates.csv'):
+        self.db_file = db_file
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS coordinates (city TEXT PRIMARY KEY, latitude REAL NOT NULL, longitude REAL NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS misses (city TEXT PRIMARY KEY, expires REAL NOT NULL)")
+            empty = conn.execute("SELECT NOT EXISTS (SELECT 1 FROM coordinates)").fetchone()[0]
+        if empty and seed_csv and os.path.exists(seed_csv):
+            self.put_many(CsvCoordinatesStore(seed_csv).data)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Returns the connection of the calling thread, connections cannot be shared between threads."""
+        conn: Optional[sqlite3.Connection] = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _select(self, sql: str, keys: Iterable[str]) -> List[Tuple[Any, ...]]:
+        """Runs an "IN (...)" query over the keys in chunks that stay below the SQLite variable limit."""
+        rows: List[Tuple[Any, ...]] = []
+        key_list: List[str] = list(keys)
+        conn = self._connect()
+        for start in range(0, len(key_list), 500):
+            chunk = key_list[start:start + 500]
+            rows.extend(conn.execute(sql.format(placeholders=",".join("?" * len(chunk))), chunk))
+        return rows
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Tuple[float, float]]:
+        rows = self._select("SELECT city, latitude, longitude FROM coordinates WHERE city IN ({placeholders})", keys)
+        return {city: (latitude, longitude) for city, latitude, longitude in rows}
+
+    def put_many(self, items: Dict[str, Tuple[float, float]]) -> None:
+        with self._connect() as conn: # one transaction
+            conn.executemany("INSERT OR REPLACE INTO coordinates (city, latitude, longitude) VALUES (?, ?, ?)",
+                             [(city, latitude, longitude) for city, (latitude, longitude) in items.items()])
+            conn.executemany("DELETE FROM misses WHERE city = ?", [(city,) for city in items])
+
+    def get_misses(self, keys: Iterable[str]) -> Dict[str, float]:
+        rows = self._select("SELECT city, expires FROM misses WHERE city IN ({placeholders})", keys)
+        return {city: expires for city, expires in rows}
+
+    def put_misses(self, items: Dict[str, float]) -> None:
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO misses (city, expires) VALUES (?, ?)", list(items.items()))
+
+class CoordinatesManager:
+    """
+    Manages city coordinates backed by a pluggable CoordinatesStore.
+    
+    This class provides functionality to look up city coordinates in the store, keep
+    them in a dictionary for repeated lookups, and geocode and store the cities that
+    are not known yet. The default store is the CSV file.
+    """
+    data: Dict[str, Tuple[float, float]] # in-process cache of the store
+    misses: Dict[str, float] # in-process cache of the misses, key -> expiry
+    store: CoordinatesStore
+
+    def __init__(self, csv_file='coordinates.csv', geolocator: Optional[Any] = None, max_workers: int = 4,
+                 min_interval: float = 1.0, attempts: int = 5, backoff: float = 1.0, store: Optional[CoordinatesStore] = None,
+                 miss_ttl: float = 7 * 24 * 3600.0, failure_ttl: float = 900.0, aliases: Optional[Dict[str, str]] = None):
+        """
+        Initialize the CityCoordinatesManager with a CSV file for storing city coordinates.
+        
+        Args:
+            csv_file (str): The path to the CSV file containing city coordinates, used when no store is given.
+            geolocator (Optional[Any]): The geocoder, anything with a geocode(query) method, defaults to Nominatim
+            max_workers (int): The number of concurrent geocoding requests in get_many
+            min_interval (float): The minimum number of seconds between requests (Nominatim allows one per second)
+            attempts (int): The number of attempts for a failing request
+            backoff (float): The initial retry delay in seconds, doubled on each retry
+            store (Optional[CoordinatesStore]): The coordinates store, defaults to a CsvCoordinatesStore for csv_file
+            miss_ttl (float): Seconds a city the service could not find is not looked up again
+            failure_ttl (float): Seconds a city whose lookups failed (errors, timeouts) is not looked up again
+            aliases (Optional[Dict[str, str]]): Normalized alias -> normalized city, defaults to ALIASES
+        """
+
+        self.store = store or CsvCoordinatesStore(csv_file)
+        self.data = {}
+        self.misses = {}
+        self.miss_ttl = miss_ttl
+        self.failure_ttl = failure_ttl
+        self.aliases = ALIASES if aliases is None else aliases
+        self.geolocator = geolocator or Nominatim(user_agent="city_coordinates_manager")
+        self.max_workers = max_workers
+        self.attempts = attempts
+        self.backoff = backoff
+        self.rate_limiter = RateLimiter(min_interval)
 
     def _fetch_coordinates(self, city):
-        """Fetch coordinates from an online geocoding service."""
+        """Fetch coordinates from an online geocoding service, retrying failed requests with backoff."""
         location = None
-        for attempt in range(10):
+        delay = self.backoff
+        for attempt in range(self.attempts):
             if attempt > 0:
                 print(f"... Notice: Retry {attempt} to fetch coordinates for {city} ...")
+                time.sleep(delay)
+                delay *= 2
+            self.rate_limiter.wait()
             try:
                 location = self.geolocator.geocode(city)
-                if location:
-                    break
+                break # an empty result is an answer, only errors are retried
             except Exception:
-                if attempt == 9:
-                    raise ValueError(f"... Warning: Could not fetch coordinates for {city} after 10 attempts ...")
+                if attempt == self.attempts - 1:
+                    raise ValueError(f"... Warning: Could not fetch coordinates for {city} after {self.attempts} attempts ...")
         if location and isinstance(location, Location):
             return location.latitude, location.longitude
         else:
-            raise ValueError(f"... Warning: Coordinates for {city}, could not be found ...")
+            raise CoordinatesNotFound(f"... Warning: Coordinates for {city}, could not be found ...")
+
+    def _load(self, keys: List[str]) -> List[str]:
+        """
+        Loads coordinates and unexpired misses for the keys from the store into memory.
+
+        Returns:
+            List[str]: The keys that are neither known nor a cached miss, i.e. need geocoding
+        """
+        now: float = time.time()
+        unknown: List[str] = [key for key in keys if key not in self.data and self.misses.get(key, 0.0) <= now]
+        if unknown:
+            self.data.update(self.store.get_many(unknown))
+            unknown = [key for key in unknown if key not in self.data]
+        if unknown:
+            self.misses.update(self.store.get_misses(unknown))
+            unknown = [key for key in unknown if self.misses.get(key, 0.0) <= now]
+        return unknown
+
+    def _record_misses(self, errors: Dict[str, ValueError]) -> None:
+        """Caches failed lookups, a city that was not found expires later than a failed request."""
+        now: float = time.time()
+        expires: Dict[str, float] = {
+            key: now + (self.miss_ttl if isinstance(error, CoordinatesNotFound) else self.failure_ttl)
+            for key, error in errors.items()
+        }
+        self.misses.update(expires)
+        self.store.put_misses(expires)
 
     def get(self, city) -> Tuple[float, float]:
         """
         Get coordinates for a city.
         If not found in local data, fetch from an online service and save.
+        Raises ValueError (without a lookup) while a previous miss is cached.
         """
         coordinates: Tuple[float, float]
 
-        city_key = f"{city}".lower()
+        city_key = normalize_city(city, self.aliases)
         if city_key in self.data:
             return self.data[city_key]
-        else:
+        if not self._load([city_key]):
+            if city_key in self.data:
+                return self.data[city_key]
+            raise CoordinatesNotFound(f"... Warning: Coordinates for {city}, cached as not found ...")
+        try:
             coordinates = self._fetch_coordinates(city)
-            self.data[city_key] = coordinates
-            self._write_csv()
-            return coordinates
+        except ValueError as e:
+            self._record_misses({city_key: e})
+            raise
+        self.store.put_many({city_key: coordinates})
+        self.data[city_key] = coordinates
+        return coordinates
+
+    @traced()
+    def get_many(self, cities: Iterable[str]) -> Dict[str, Tuple[float, float]]:
+        """
+        Get coordinates for many cities at once.
+
+        Cities are deduplicated, the unknown ones are geocoded by a bounded worker pool
+        that respects the rate limit, and all new coordinates are written to the store in
+        a single update. Cities that cannot be resolved are left out and cached as misses,
+        so they are not looked up again until the miss expires.
+
+        Args:
+            cities (Iterable[str]): The city names
+
+        Returns:
+            Dict[str, Tuple[float, float]]: The coordinates for each resolved city, keyed by the given name
+        """
+        names: Dict[str, str] = {} # city key -> first name seen
+        requested: Dict[str, str] = {} # city name -> city key
+        for city in cities:
+            requested[city] = normalize_city(city, self.aliases)
+            names.setdefault(requested[city], city)
+
+        missing: List[str] = self._load(list(names))
+        fetched: Dict[str, Tuple[float, float]] = {}
+        errors: Dict[str, ValueError] = {}
+
+        def fetch(key: str) -> Union[Tuple[float, float], ValueError]:
+            try:
+                return self._fetch_coordinates(names[key])
+            except ValueError as e:
+                print(e)
+                return e
+
+        if missing:
+            with span("geocode", cities=len(missing)) as record, ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(missing)))) as pool:
+                for key, result in zip(missing, pool.map(fetch, missing)):
+                    if isinstance(result, ValueError):
+                        errors[key] = result
+                    else:
+                        fetched[key] = result
+                if record is not None:
+                    record["inputs"]["failed"] = len(errors)
+            if fetched:
+                self.store.put_many(fetched)
+                self.data.update(fetched)
+            if errors:
+                self._record_misses(errors)
+
+        return {city: self.data[key] for city, key in requested.items() if key in self.data}
 
 def test_coordinates_manager():
     """
@@ -160,5 +434,47 @@ def test_coordinates_manager():
         except ValueError as e:
             print(e)
 
+def test_coordinates_manager_get_many():
+    """
+    Test CoordinatesManager.get_many with a stubbed geolocator and a temporary CSV file.
+    """
+    from utilities.synthetic import StubGeolocator
+    known = {f"City {i}": (float(i), float(-i)) for i in range(20)}
+    geolocator = StubGeolocator(known, latency=0.05)
+    with tempfile.TemporaryDirectory() as directory:
+        csv_file = os.path.join(directory, "coordinates.csv")
+        mgr = CoordinatesManager(csv_file, geolocator=geolocator, max_workers=4, min_interval=0.0)
+        cities = list(known) * 3 + ["Nowhere"]
+        start = time.perf_counter()
+        result = mgr.get_many(cities)
+        elapsed = time.perf_counter() - start
+        assert len(result) == 20 and "Nowhere" not in result
+        assert sorted(geolocator.queries) == sorted(list(known) + ["Nowhere"]) # deduplicated
+        assert CsvCoordinatesStore(csv_file).data == mgr.data # one atomic write
+
+        db_file = os.path.join(directory, "coordinates.db")
+        store = SqliteCoordinatesStore(db_file, seed_csv=csv_file) # seeded from the CSV file
+        mgr = CoordinatesManager(geolocator=geolocator, store=store)
+        assert mgr.get_many(cities) == result and len(geolocator.queries) == 21 + 1 # only "Nowhere" again
+        assert mgr.get_many(cities) == result and len(geolocator.queries) == 22 # "Nowhere" is a cached miss
+        assert mgr.get_many(["  city 1 ", "CITY   2"]) == {"  city 1 ": known["City 1"], "CITY   2": known["City 2"]}
+        print(f"get_many: {len(result)} cities, {len(geolocator.queries)} lookups in {elapsed:.2f}s")
+
+_managers: Dict[str, CoordinatesManager] = {}
+_managers_lock: threading.Lock = threading.Lock()
+
+def get_coordinates_manager(db_file: str = 'coordinates.db', seed_csv: Optional[str] = 'coordinates.csv') -> CoordinatesManager:
+    """
+    Returns the process wide CoordinatesManager for an SQLite coordinates database.
+
+    Streamlit sessions share the manager, so the store is opened once per process and
+    coordinates that were already looked up are served from memory.
+    """
+    with _managers_lock:
+        if db_file not in _managers:
+            _managers[db_file] = CoordinatesManager(store=SqliteCoordinatesStore(db_file, seed_csv))
+        return _managers[db_file]
+
 if __name__ == "__main__":
+    test_coordinates_manager_get_many()
     test_coordinates_manager()
\ No newline at end of file
@@ -0,0 +1,159 @@
+"""
+Copyright (c) 2024-2025, All rights reserved, Use subject to license terms.
+Scott Fehrman, scott.fehrman@sailpoint.com
+"""
+
+import hashlib
+import numpy as np
+import pandas as pd
+import streamlit as st
+import utilities.constants as CONSTANTS
+from typing import Dict, List, Optional, Tuple
+from utilities.aggregates import IdentityCube
+from utilities.hierarchy import OrgHierarchy
+
+MANAGER_OPTIONS: int = 200 # managers offered by the organization selector
+
+class IdentityFilter:
+    """
+    A selection of identities: locations, departments, a manager subtree and the manager flag.
+
+    An empty tuple or None means the dimension is not filtered. The signature is a
+    short, stable hash of the selection, used in the cache keys of filtered stages.
+    """
+    locations: Tuple[str, ...]
+    departments: Tuple[str, ...]
+    manager: Optional[int] # node index of the manager whose organization is selected
+    is_manager: Optional[bool]
+
+    def __init__(self, locations: Tuple[str, ...] = (), departments: Tuple[str, ...] = (),
+                 manager: Optional[int] = None, is_manager: Optional[bool] = None):
+        self.locations = tuple(sorted(locations))
+        self.departments = tuple(sorted(departments))
+        self.manager = manager
+        self.is_manager = is_manager
+
+    def is_empty(self) -> bool:
+        return not self.locations and not self.departments and self.manager is None and self.is_manager is None
+
+    def signature(self) -> str:
+        return hashlib.sha1(repr((self.locations, self.departments, self.manager, self.is_manager)).encode()).hexdigest()[:12]
+
+    def cube_only(self) -> bool:
+        """Returns True when only the cube attributes (department, location) are filtered."""
+        return self.manager is None and self.is_manager is None
+
+class FilterIndex:
+    """
+    Column index over the identity frame for evaluating filters as boolean masks.
+
+    The location and department categories are kept as integer codes, so a selection
+    of values is one vectorized isin over small integers. A manager subtree is a
+    contiguous slice of the hierarchy pre-order, so its mask is one slice assignment.
+    Building a mask is linear in the number of identities with a tiny constant,
+    milliseconds for a million identities. The index also keeps the options of the
+    filter selectors, so rendering them does not touch the identities.
+    """
+    codes: Dict[str, np.ndarray]
+    categories: Dict[str, pd.Index]
+    is_manager: np.ndarray
+    order: np.ndarray
+    position: np.ndarray
+    subtree_size: np.ndarray
+    managers: pd.Series # node index -> "name (reports)", largest organization first
+
+    def __init__(self, df: pd.DataFrame, hierarchy: OrgHierarchy):
+        """
+        Initialize the FilterIndex.
+
+        Args:
+            df (pd.DataFrame): The identity frame (see utilities.frames)
+            hierarchy (OrgHierarchy): The hierarchy built from the same frame
+        """
+
+        self.codes = {}
+        self.categories = {}
+        for attr in (CONSTANTS.LOCATION, CONSTANTS.DEPARTMENT):
+            values = df[attr].astype("category")
+            self.codes[attr] = values.cat.codes.to_numpy()
+            self.categories[attr] = values.cat.categories
+        self.is_manager = df[CONSTANTS.IS_MANAGER].to_numpy(dtype=bool, na_value=False)
+        self.order = np.asarray(hierarchy.order, dtype=np.int64)
+        self.position = np.asarray(hierarchy.position, dtype=np.int64)
+        self.subtree_size = np.asarray(hierarchy.subtree_size, dtype=np.int64)
+
+        nodes = np.flatnonzero(self.subtree_size > 1)
+        nodes = nodes[np.argsort(-self.subtree_size[nodes], kind="stable")]
+        names = df[CONSTANTS.NAME].astype(str).to_numpy()[nodes]
+        self.managers = pd.Series([f"{name} ({size - 1:,})" for name, size in zip(names, self.subtree_size[nodes])], index=nodes)
+
+    def __len__(self) -> int:
+        return len(self.is_manager)
+
+    def mask(self, selection: IdentityFilter) -> np.ndarray:
+        """Returns the boolean mask of the identities matching every filtered dimension."""
+        mask = np.ones(len(self), dtype=bool)
+        for attr, selected in ((CONSTANTS.LOCATION, selection.locations), (CONSTANTS.DEPARTMENT, selection.departments)):
+            if selected:
+                wanted = self.categories[attr].get_indexer(list(selected))
+                mask &= np.isin(self.codes[attr], wanted[wanted >= 0])
+        if selection.is_manager is not None:
+            mask &= self.is_manager == selection.is_manager
+        if selection.manager is not None:
+            start = self.position[selection.manager]
+            subtree = np.zeros(len(self), dtype=bool)
+            subtree[self.order[start:start + self.subtree_size[selection.manager]]] = True
+            mask &= subtree
+        return mask
+
+def get_filtered_cube(cube: IdentityCube, df: pd.DataFrame, selection: IdentityFilter) -> IdentityCube:
+    """
+    Returns the cube of the selected identities.
+
+    Location and department filters slice the cube of all identities without touching
+    the identities; the other filters regroup the already filtered frame.
+
+    Args:
+        cube (IdentityCube): The cube of all identities
+        df (pd.DataFrame): The filtered identity frame
+        selection (IdentityFilter): The filter
+    """
+    if selection.cube_only():
+        values = {attr: selected for attr, selected in ((CONSTANTS.LOCATION, selection.locations), (CONSTANTS.DEPARTMENT, selection.departments)) if selected}
+        return cube.where(values)
+    return IdentityCube(df, cube.x_attr, cube.y_attr, cube.data_attr)
+
+def render_filters(index: FilterIndex, key: str = "filter") -> IdentityFilter:
+    """
+    Renders the filter selectors in the sidebar and returns the selection.
+
+    The manager selector lists the MANAGER_OPTIONS largest organizations whose manager
+    name contains the search text, so its size does not grow with the tenant. The
+    selected organization stays listed when the search no longer matches it.
+
+    Args:
+        index (FilterIndex): The filter index of the identity frame, provides the options
+        key (str): A unique prefix for the widget keys
+    """
+    sidebar = st.sidebar.expander("Filters", expanded=False)
+    locations: List[str] = sidebar.multiselect("Location", [str(value) for value in index.categories[CONSTANTS.LOCATION]], key=f"{key}_location")
+    departments: List[str] = sidebar.multiselect("Department", [str(value) for value in index.categories[CONSTANTS.DEPARTMENT]], key=f"{key}_department")
+
+    search = sidebar.text_input("Search managers", key=f"{key}_manager_search").strip()
+    managers = index.managers
+    if search:
+        managers = managers[managers.str.contains(search, case=False, regex=False)]
+    managers = managers.head(MANAGER_OPTIONS)
+    selected = st.session_state.get(f"{key}_manager")
+    if selected is not None and selected not in managers.index:
+        if selected in index.managers.index:
+            managers = pd.concat([index.managers.loc[[selected]], managers])
+        else: # not a manager of this dataset version
+            st.session_state[f"{key}_manager"] = None
+    manager: Optional[int] = sidebar.selectbox("Organization of", managers.index.tolist(), index=None, key=f"{key}_manager",
+                                               format_func=lambda node: managers.at[node])
+
+    flag = sidebar.radio("Managers", ["All", "Managers only", "Non-managers only"], horizontal=True, key=f"{key}_is_manager")
+    is_manager: Optional[bool] = None if flag == "All" else flag == "Managers only"
+
+    return IdentityFilter(tuple(locations), tuple(departments), manager, is_manager)
@@ -0,0 +1,72 @@
+"""
+Copyright (c) 2024-2025, All rights reserved, Use subject to license terms.
+Scott Fehrman, scott.fehrman@sailpoint.com
+"""
+
+import pandas as pd
+import utilities.constants as CONSTANTS
+from typing import Any, Dict, Iterable, List, Optional
+from sailpoint.v2025.models.identity import Identity
+from utilities.tracing import traced
+
+@traced()
+def get_identity_frame(identities: Iterable[Identity]) -> pd.DataFrame:
+    """
+    Projects identities into a typed, columnar DataFrame.
+
+    This function reads only the fields used by the dashboards straight from the
+    Identity objects, skipping the to_dict / DataFrame / json_normalize round trip.
+    Location, department and title are stored as categoricals. The compact identity
+    store (see utilities.store) is built from this frame.
+
+    Args:
+        identities (Iterable[Identity]): The identities to project
+
+    Returns:
+        pd.DataFrame: One row per identity with the columns id, name, is_manager, manager_id, has_attributes, title, department and location
+    """
+
+    identity: Identity
+    attributes_dict: Dict[str, Any]
+    ids: List[Optional[str]] = []
+    names: List[Optional[str]] = []
+    managers: List[bool] = []
+    manager_ids: List[Optional[str]] = []
+    has_attributes: List[bool] = []
+    titles: List[Optional[str]] = []
+    departments: List[Optional[str]] = []
+    locations: List[Optional[str]] = []
+
+    for identity in identities:
+        attributes_dict = identity.attributes or {}
+        ids.append(identity.id)
+        names.append(identity.name)
+        managers.append(identity.is_manager is True)
+        manager_ids.append(identity.manager_ref.id if identity.manager_ref else None)
+        has_attributes.append(bool(identity.attributes))
+        titles.append(get_attribute(attributes_dict, CONSTANTS.TITLE))
+        departments.append(get_attribute(attributes_dict, CONSTANTS.DEPARTMENT))
+        locations.append(get_attribute(attributes_dict, CONSTANTS.LOCATION))
+
+    return pd.DataFrame({
+        CONSTANTS.ID: pd.array(ids, dtype="string"),
+        CONSTANTS.NAME: pd.array(names, dtype="string"),
+        CONSTANTS.IS_MANAGER: pd.array(managers, dtype="bool"),
+        CONSTANTS.MANAGER_ID: pd.array(manager_ids, dtype="string"),
+        CONSTANTS.HAS_ATTRIBUTES: pd.array(has_attributes, dtype="bool"),
+        CONSTANTS.TITLE: pd.Categorical(titles),
+        CONSTANTS.DEPARTMENT: pd.Categorical(departments),
+        CONSTANTS.LOCATION: pd.Categorical(locations),
+    })
+
+@traced()
+def get_normalized_frame(identities: Iterable[Identity]) -> pd.DataFrame:
+    """
+    Creates the fully normalized DataFrame with every identity field, for display only.
+    """
+    return pd.json_normalize([identity.to_dict() for identity in identities])
+
+def get_attribute(attributes_dict: Dict[str, Any], name: str) -> Optional[str]:
+    """Returns an attribute as a string, empty values are returned as None."""
+    value = attributes_dict.get(name)
+    return str(value) if value else None
@@ -3,39 +3,46 @@ Copyright (c) 2024-2025, All rights reserved, Use subject to license terms.
 Scott Fehrman, scott.fehrman@sailpoint.com
 """
 
+import math
+import numpy as np
+import pydeck
+import pandas as pd
 import utilities.constants as CONSTANTS
 from pyvis.network import Network
-from typing import List, Dict, Any
-from pydantic import StrictStr
-from sailpoint.v2025.models.identity import Identity
+from typing import List, Dict, Any, Optional, Set, Tuple
+from utilities.hierarchy import OrgHierarchy, OrgTreeView
+from utilities.maps import hex_to_rgb
+from utilities.clusters import GraphSummary, OTHER
+from utilities.store import IdentityStore
+from utilities.mesh import AccessMesh, ACCESS_KEY, JACCARD
+from utilities.tracing import traced
 
 
-def get_reportsto(identities: List[Identity]) -> Network:
+@traced()
+def get_reportsto(store: IdentityStore) -> Network:
     """
     Creates a network graph visualization of the reporting relationships between identities.
     
     This function builds a directed graph where each node represents an identity and edges
     represent reporting relationships. Managers are displayed as hexagons, while regular
     employees are displayed as dots. Node colors are based on location, and node sizes
-    vary based on whether the identity is a manager.
+    vary based on whether the identity is a manager. The graph is built from the compact
+    identity store, managers are resolved through the interned parent indexes.
     
     Args:
-        identities (List[Identity]): A list of Identity objects to visualize in the graph
+        store (IdentityStore): The identities to visualize in the graph (see utilities.store)
         
     Returns:
         Network: A pyvis Network object containing the reporting relationships graph
     """
 
     net: Network
-    identity: Identity
-    identity_dict: Dict[str, Identity] = {}
-    identity_id: StrictStr
-    identity_name: str
-    manager_id: str
-    attr_title: str
-    attr_department: str
+    node: int
+    manager: int
+    identity_id: str
+    attr_title: Optional[str]
+    attr_department: Optional[str]
     attr_location: str
-    attributes_dict: Dict[str, Any] # identity attributes
     node_label: str # node name
     node_title: str # node name
     node_color: str # color for the node
@@ -48,80 +55,319 @@ def get_reportsto(identities: List[Identity]) -> Network:
     net = Network(height="750px", width="100%", directed=True)
 
     location_colors = CONSTANTS.SPTK_WHITEBG_COLORS
+    added = np.zeros(len(store), dtype=bool)
 
-    # Loop through the list of identities and add them to the graph as nodes
-    for identity in identities:
-        if identity.id:
-            identity_id = identity.id
-            identity_dict[identity_id] = identity
+    # Loop through the identities and add them to the graph as nodes
+    for node in range(len(store)):
+        identity_id = store.ids[node]
+        if not identity_id:
+            print(f"WARNING: Identity has no ID (unlikely)")
+            continue
+        if not store.has_attributes[node]:
+            print(f"WARNING: Identity {identity_id} has no attributes") # DEBUG
+            continue
 
-            identity_name = identity.name
+        node_label = store.names[node]
+        node_title = node_label
 
-            node_label = identity_name
-            node_title = identity_name
+        if store.is_manager[node]:
+            node_size = 30
+            node_shape = "hexagon"
+        else:
+            node_size = 20
+            node_shape = "dot"
 
-            if identity.is_manager == True:
-                node_size = 30
-                node_shape = "hexagon"
-            else:
-                node_size = 20
-                node_shape = "dot"
+        attr_title = store.title[node]
+        if attr_title:
+            node_title += f"\n{attr_title}"
 
-            attr_title = ""
-            attr_department = ""
-            attr_location = "Unknown"
+        attr_department = store.department[node]
+        if attr_department:
+            node_title += f"\nDepartment: {attr_department}"
 
-            if identity.attributes:
-                attributes_dict = identity.attributes
+        attr_location = store.location[node] or "Unknown"
+        if attr_location != "Unknown":
+            node_title += f"\nLocation: {attr_location}"
 
-                if attributes_dict.get(CONSTANTS.TITLE):
-                    attr_title = str(attributes_dict.get(CONSTANTS.TITLE))
-                    if attr_title:
-                        node_title += f"\n{attr_title}"
+        if attr_location not in location_dict:
+            location_dict[attr_location] = location_colors[color_offset]
+            color_offset += 1
 
-                if attributes_dict.get(CONSTANTS.DEPARTMENT):
-                    attr_department = str(attributes_dict.get(CONSTANTS.DEPARTMENT))
-                    if attr_department:
-                        node_title += f"\nDepartment: {attr_department}"
+        node_color = location_dict[attr_location] # each location has a different color
 
-                if attributes_dict.get(CONSTANTS.LOCATION):
-                    attr_location = str(attributes_dict.get(CONSTANTS.LOCATION))
-                    if attr_location:
-                        node_title += f"\nLocation: {attr_location}"
+        net.add_node(identity_id, label=node_label, title=node_title, size=node_size, shape=node_shape, color=node_color)
+        added[node] = True
 
-                if attr_location not in location_dict:
-                    location_dict[attr_location] = location_colors[color_offset]
-                    color_offset += 1
+    # Add edges between the identity and its manager, the parent indexes are -1 (no manager) or -2 (not in the tenant)
+    for node in np.flatnonzero(added & (store.parent >= 0)):
+        manager = int(store.parent[node])
+        if not added[manager]: # Manager reference does not exist in the graph
+            continue
+        edge_color = "red" if manager == node else "black" # Self reference
+        net.add_edge(store.ids[node], store.ids[manager], color=edge_color)
 
-                node_color = location_dict[attr_location] # each location has a different color
+    return net
 
-                net.add_node(identity_id, label=node_label, title=node_title, size=node_size, shape=node_shape, color=node_color)
+@traced()
+def get_reportsto_deck(df: pd.DataFrame, hierarchy: OrgHierarchy, width: int = 1200) -> pydeck.Deck:
+    """
+    Creates a WebGL rendering of the reporting relationships for large organizations.
 
-                # print(f"Node: {identity_id} - {identity_name}") # DEBUG
-            else:
-                print(f"WARNING: Identity {identity_id} has no attributes") # DEBUG
-                continue
-        else:
-            print(f"WARNING: Identity has no ID (unlikely)")
-            continue
+    The layout is computed once on the server from the manager hierarchy (see
+    OrgHierarchy.layout), so the browser does not run a physics simulation. Nodes and
+    edges are sent as compact records with short keys and drawn by deck.gl in an
+    orthographic view, which stays interactive well beyond 100k identities.
+
+    Args:
+        df (pd.DataFrame): The identity frame (see utilities.frames)
+        hierarchy (OrgHierarchy): The hierarchy built from the same frame
+        width (int): The expected width of the chart in pixels, used for the initial zoom
+
+    Returns:
+        pydeck.Deck: A deck with a line layer for the edges and a scatterplot layer for the identities
+    """
+
+    x: List[float]
+    y: List[float]
+    location_colors: Dict[str, List[int]] = {}
+    node_data: List[Dict[str, Any]] = []
+    edge_data: List[Dict[str, Any]] = []
+
+    x, y = hierarchy.layout()
+
+    names = df[CONSTANTS.NAME].tolist()
+    titles = df[CONSTANTS.TITLE].tolist()
+    locations = df[CONSTANTS.LOCATION].astype("object").fillna("Unknown").tolist()
+    managers = df[CONSTANTS.IS_MANAGER].tolist()
+
+    for node in hierarchy.order:
+        location = locations[node]
+        if location not in location_colors:
+            location_colors[location] = hex_to_rgb(CONSTANTS.SPTK_WHITEBG_COLORS[len(location_colors) % len(CONSTANTS.SPTK_WHITEBG_COLORS)])
+        position = [round(x[node], 2), round(y[node], 2)]
+        title = titles[node] if isinstance(titles[node], str) else ""
+        node_data.append({"p": position, "c": location_colors[location], "r": 5 if managers[node] else 3,
+                          "n": f"{names[node]}\n{title}\nLocation: {location}"})
+        manager = hierarchy.parent[node]
+        if manager >= 0:
+            edge_data.append({"s": position, "t": [round(x[manager], 2), round(y[manager], 2)]})
+
+    edge_layer = pydeck.Layer(
+        "LineLayer",
+        data=edge_data,
+        get_source_position="s",
+        get_target_position="t",
+        get_color=[80, 80, 80, 120],
+        get_width=1,
+    )
+
+    node_layer = pydeck.Layer(
+        "ScatterplotLayer",
+        data=node_data,
+        get_position="p",
+        get_fill_color="c",
+        get_radius="r",
+        radius_units="pixels",
+        pickable=True,
+        auto_highlight=True,
+    )
+
+    span_x, center_x, center_y = _bounds(x, y)
+    view_state = pydeck.ViewState(
+        target=[center_x, center_y, 0],
+        zoom=math.log2(width / span_x),
+        min_zoom=-20,
+        max_zoom=10,
+    )
 
-    # Iterate through the dictionary of identities and add edges between the identity and its manager
-    for identity_id, identity in identity_dict.items():
-        if identity.manager_ref and identity.manager_ref.id:
-            manager_id = identity.manager_ref.id
-            if manager_id in identity_dict:
-                if manager_id == identity_id: # Self reference
-                    edge_color = "red"
-                else:
-                    edge_color = "black"
-                net.add_edge(identity_id, manager_id, color=edge_color)
-                # print(f"Edge: {identity.get('name')} -> {identity.get('managerRef').get('name')}") # DEBUG
-            else: # Manager reference does not exist, to add "unknown manager" node, uncomment the following lines
-                # if "not_exist" not in identity_dict:
-                #     net.add_node("not_exist", label="Not Found", color="black", size=30, shape="diamond")
-                # net.add_edge(identity_id, "not_exist", color="red")
-                continue
+    return pydeck.Deck(
+        layers=[edge_layer, node_layer],
+        views=[pydeck.View(type="OrthographicView", controller=True)],
+        initial_view_state=view_state,
+        map_style=None,
+        tooltip={"text": "{n}"}, # type: ignore
+    )
+
+@traced()
+def get_reportsto_tree(df: pd.DataFrame, hierarchy: OrgHierarchy, view: OrgTreeView) -> Network:
+    """
+    Creates a network graph of the visible part of a lazily expanded org tree.
+
+    Only the nodes in the view are added, so the cost is bound by what the user has
+    expanded rather than by the size of the tenant. Collapsed managers show the number
+    of identities in their subtree and are drawn as diamonds.
+
+    Args:
+        df (pd.DataFrame): The identity frame (see utilities.frames)
+        hierarchy (OrgHierarchy): The hierarchy built from the same frame
+        view (OrgTreeView): The expand / collapse state
+
+    Returns:
+        Network: A pyvis Network object with a hierarchical layout
+    """
+
+    net: Network
+    node_label: str
+    node_title: str
+    node_shape: str
+    location_dict: Dict[str, str] = {} # location -> color
+    expanded = set(view.expanded)
+    visible = set(view.visible)
+
+    net = Network(height="750px", width="100%", directed=True)
+    net.set_options('{"layout": {"hierarchical": {"enabled": true, "direction": "UD", "sortMethod": "directed"}}, "physics": {"enabled": false}}')
+
+    names = df[CONSTANTS.NAME]
+    titles = df[CONSTANTS.TITLE]
+    locations = df[CONSTANTS.LOCATION]
+
+    for node in view.visible:
+        identity_id = hierarchy.ids[node]
+        attr_location = locations.iat[node] if isinstance(locations.iat[node], str) else "Unknown"
+        if attr_location not in location_dict:
+            location_dict[attr_location] = CONSTANTS.SPTK_WHITEBG_COLORS[len(location_dict) % len(CONSTANTS.SPTK_WHITEBG_COLORS)]
+
+        node_label = str(names.iat[node])
+        node_title = node_label
+        if isinstance(titles.iat[node], str):
+            node_title += f"\n{titles.iat[node]}"
+        node_title += f"\nLocation: {attr_location}\nDirect reports: {len(hierarchy.children[node])}\nOrganization: {hierarchy.subtree_size[node] - 1}"
+
+        if hierarchy.children[node] and node not in expanded:
+            node_label += f" (+{hierarchy.subtree_size[node] - 1})"
+            node_shape = "diamond"
+        elif hierarchy.children[node]:
+            node_shape = "hexagon"
         else:
-            continue # No manager reference, do nothing
+            node_shape = "dot"
+
+        net.add_node(identity_id, label=node_label, title=node_title, size=30 if hierarchy.children[node] else 20,
+                     shape=node_shape, color=location_dict[attr_location], level=hierarchy.depth[node])
+
+    for node in view.visible:
+        manager = hierarchy.parent[node]
+        if manager >= 0 and manager in visible:
+            net.add_edge(hierarchy.ids[node], hierarchy.ids[manager], color="black")
+
+    return net
+
+@traced()
+def get_reportsto_summary(summary: GraphSummary) -> Network:
+    """
+    Creates a network graph of supernodes from a GraphSummary.
+
+    Each node is a group of identities sized by its member count, each edge the
+    number of reporting links from one group to another. The number of elements is
+    bound by the number of groups, whatever the size of the tenant.
+
+    Args:
+        summary (GraphSummary): The grouped identities
+
+    Returns:
+        Network: A pyvis Network object with one node per group
+    """
+
+    net: Network
+    max_size: int = max(summary.sizes, default=1)
+    max_weight: int = int(summary.edges["weight"].max()) if len(summary.edges) else 1
+
+    net = Network(height="750px", width="100%", directed=True)
+
+    for group, (label, size) in enumerate(zip(summary.labels, summary.sizes)):
+        net.add_node(group, label=f"{label} ({size:,})", title=f"{label}\nIdentities: {size:,}",
+                     size=10 + 50 * math.sqrt(size / max_size), shape="dot",
+                     color="#A9A9A9" if label == OTHER else CONSTANTS.SPTK_WHITEBG_COLORS[group % len(CONSTANTS.SPTK_WHITEBG_COLORS)])
+
+    for source, target, weight in summary.edges.itertuples(index=False):
+        net.add_edge(int(source), int(target), title=f"{weight:,} reporting links",
+                     width=1 + 9 * math.log1p(weight) / math.log1p(max_weight), color="black")
+
+    return net
+
+def _bounds(x: List[float], y: List[float]) -> Tuple[float, float, float]:
+    """Returns the horizontal span and the center of the layout."""
+    if not x:
+        return 1.0, 0.0, 0.0
+    span_x = max(max(x) - min(x), 1.0)
+    return span_x, (max(x) + min(x)) / 2, (max(y) + min(y)) / 2
+
+@traced()
+def get_access_cooccurrence(mesh: AccessMesh, pairs: pd.DataFrame) -> Network:
+    """
+    Creates a network graph of access items that are held together (role mining candidates).
+
+    Nodes are the access items in the pairs, sized by the number of holders and colored
+    by access type; edges are weighted by the number of identities holding both.
+
+    Args:
+        mesh (AccessMesh): The identity to access matrix
+        pairs (pd.DataFrame): The pairs from AccessMesh.cooccurrence
+
+    Returns:
+        Network: A pyvis Network object with one node per access item
+    """
+
+    net: Network
+    type_colors: Dict[str, str] = {}
+    holders = np.asarray(mesh.matrix.sum(axis=0)).ravel()
+    access = mesh.access.set_index(ACCESS_KEY)
+    position = pd.Series(np.arange(len(mesh.access)), index=mesh.access[ACCESS_KEY])
+    max_holders: float = float(holders.max()) if len(holders) else 1.0
+    max_count: int = int(pairs["count"].max()) if len(pairs) else 1
+
+    net = Network(height="750px", width="100%")
+
+    for key in pd.unique(pairs[["source", "target"]].to_numpy().ravel()):
+        access_type = access.at[key, "access_type"]
+        if access_type not in type_colors:
+            type_colors[access_type] = CONSTANTS.SPTK_WHITEBG_COLORS[len(type_colors) % len(CONSTANTS.SPTK_WHITEBG_COLORS)]
+        count = int(holders[position[key]])
+        net.add_node(key, label=str(access.at[key, "access_name"]), title=f"{access.at[key, 'access_name']}\nType: {access_type}\nHolders: {count:,}",
+                     size=10 + 30 * math.sqrt(count / max_holders), shape="dot", color=type_colors[access_type])
+
+    for source, target, count, jaccard in pairs.itertuples(index=False):
+        net.add_edge(source, target, title=f"{count:,} identities hold both (Jaccard {jaccard:.2f})",
+                     width=1 + 9 * math.log1p(count) / math.log1p(max_count), color="gray")
+
+    return net
+
+@traced()
+def get_access_peers(mesh: AccessMesh, df: pd.DataFrame, node: int, peers: pd.DataFrame) -> Network:
+    """
+    Creates a bipartite network graph of an identity, its closest peers and their access.
+
+    Access held by the identity is drawn in green, access its peers hold but the identity
+    does not in orange, so missing or excess access stands out.
+
+    Args:
+        mesh (AccessMesh): The identity to access matrix
+        df (pd.DataFrame): The identity frame (see utilities.frames)
+        node (int): The node index of the identity
+        peers (pd.DataFrame): The peers from AccessMesh.peers
+
+    Returns:
+        Network: A pyvis Network object with identity and access nodes
+    """
+
+    net: Network
+    names = df[CONSTANTS.NAME]
+    keys = mesh.access[ACCESS_KEY].to_numpy()
+    access_names = mesh.access["access_name"].to_numpy()
+    own = set(mesh.matrix[node].indices)
+    added: Set[str] = set()
+
+    net = Network(height="750px", width="100%")
+
+    for identity, similarity in [(node, 1.0)] + list(zip(peers["node"], peers[JACCARD])):
+        identity = int(identity)
+        net.add_node(f"identity:{identity}", label=str(names.iat[identity]), title=f"{names.iat[identity]}\nJaccard: {similarity:.2f}",
+                     shape="hexagon" if identity == node else "dot", size=30 if identity == node else 20, color="#4A90E2")
+        for column in mesh.matrix[identity].indices:
+            key = keys[column]
+            if key not in added:
+                added.add(key)
+                net.add_node(key, label=str(access_names[column]), title=f"{access_names[column]}\n{key}", shape="square", size=10,
+                             color="#66CC00" if column in own else "#FF9900")
+            net.add_edge(f"identity:{identity}", key, color="lightgray")
 
     return net
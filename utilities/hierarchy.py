@@ -0,0 +1,204 @@
+"""
+Copyright (c) 2024-2025, All rights reserved, Use subject to license terms.
+Scott Fehrman, scott.fehrman@sailpoint.com
+"""
+
+import pandas as pd
+import utilities.constants as CONSTANTS
+from typing import Dict, List, Optional, Sequence, Tuple
+
+class OrgHierarchy:
+    """
+    Index of the reports-to forest defined by the identity manager references.
+
+    Identities are addressed by their position in the input (the node index). A node is
+    a root when it has no manager, references itself or references a manager outside
+    of the tenant. Reporting loops are broken at their lowest node index so every node
+    is reachable from exactly one root.
+    """
+    ids: List[str]
+    index: Dict[str, int] # identity id -> node index
+    manager: List[int] # node index of the referenced manager as loaded (loops kept), -1 when none or outside the tenant
+    parent: List[int] # node index of the manager in the forest, -1 for roots
+    children: List[List[int]]
+    roots: List[int]
+    depth: List[int] # 0 for roots
+    order: List[int] # pre-order, every subtree is a contiguous slice
+    position: List[int] # node index -> position in the pre-order
+    subtree_size: List[int] # number of identities in the subtree, including the node
+    self_references: List[int] # nodes that reference themselves as manager
+    orphans: List[int] # nodes whose manager is not in the tenant
+    cycle_breaks: List[int] # nodes promoted to root to break a reporting loop
+
+    def __init__(self, ids: Sequence[str], manager_ids: Sequence[Optional[str]]):
+        """
+        Initialize the OrgHierarchy.
+
+        Args:
+            ids (Sequence[str]): The identity ids
+            manager_ids (Sequence[Optional[str]]): The manager id for each identity, None when there is no manager
+        """
+
+        self.ids = list(ids)
+        self.index = {identity_id: node for node, identity_id in enumerate(self.ids)}
+        self.parent = [-1] * len(self.ids)
+        self.children = [[] for _ in self.ids]
+        self.self_references = []
+        self.orphans = []
+        self.cycle_breaks = []
+
+        for node, manager_id in enumerate(manager_ids):
+            if not isinstance(manager_id, str) or not manager_id: # None, NaN or pd.NA
+                continue
+            manager = self.index.get(manager_id)
+            if manager is None:
+                self.orphans.append(node)
+            elif manager == node:
+                self.self_references.append(node)
+            else:
+                self.parent[node] = manager
+
+        self.manager = list(self.parent)
+
+        for node, manager in enumerate(self.parent):
+            if manager >= 0:
+                self.children[manager].append(node)
+
+        self.roots = [node for node, manager in enumerate(self.parent) if manager < 0]
+        self._traverse()
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "OrgHierarchy":
+        """Builds the hierarchy from the identity frame (see utilities.frames)."""
+        return cls(df[CONSTANTS.ID].tolist(), df[CONSTANTS.MANAGER_ID].tolist())
+
+    def _traverse(self) -> None:
+        """Computes the pre-order and depths iteratively, then breaks any reporting loops."""
+        self.depth = [-1] * len(self.ids)
+        self.order = []
+        self._visit(self.roots)
+
+        if len(self.order) < len(self.ids): # nodes on (or below) a loop are not reachable from a root
+            for node in range(len(self.ids)):
+                if self.depth[node] < 0:
+                    cycle_node = self._find_cycle_node(node)
+                    manager = self.parent[cycle_node]
+                    self.children[manager].remove(cycle_node)
+                    self.parent[cycle_node] = -1
+                    self.roots.append(cycle_node)
+                    self.cycle_breaks.append(cycle_node)
+                    self._visit([cycle_node])
+
+        self.position = [0] * len(self.ids)
+        for position, node in enumerate(self.order):
+            self.position[node] = position
+
+        self.subtree_size = [1] * len(self.ids)
+        for node in reversed(self.order):
+            manager = self.parent[node]
+            if manager >= 0:
+                self.subtree_size[manager] += self.subtree_size[node]
+
+    def _find_cycle_node(self, node: int) -> int:
+        """Follows the manager chain of an unreached node and returns the lowest node index of its loop."""
+        seen: Dict[int, int] = {}
+        while node not in seen:
+            seen[node] = len(seen)
+            node = self.parent[node]
+        loop: List[int] = [node]
+        current: int = self.parent[node]
+        while current != node:
+            loop.append(current)
+            current = self.parent[current]
+        return min(loop)
+
+    def _visit(self, roots: List[int]) -> None:
+        """Depth first walk from the roots, appending to the pre-order."""
+        stack: List[int] = list(reversed(roots))
+        while stack:
+            node = stack.pop()
+            manager = self.parent[node]
+            self.depth[node] = 0 if manager < 0 else self.depth[manager] + 1
+            self.order.append(node)
+            stack.extend(reversed(self.children[node]))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def subtree(self, node: int) -> List[int]:
+        """Returns the node and everyone reporting to it, directly or indirectly, in O(subtree)."""
+        start: int = self.position[node]
+        return self.order[start:start + self.subtree_size[node]]
+
+    def layout(self, x_spacing: float = 1.0, y_spacing: float = 4.0) -> Tuple[List[float], List[float]]:
+        """
+        Computes hierarchical tree coordinates for every node.
+
+        Leaves are placed left to right in pre-order and each manager is centered above
+        its first and last direct report, so trees never overlap. Runs in O(n).
+
+        Returns:
+            Tuple[List[float], List[float]]: The x and y coordinate for each node index
+        """
+        x: List[float] = [0.0] * len(self.ids)
+        y: List[float] = [depth * y_spacing for depth in self.depth]
+        next_leaf: float = 0.0
+
+        for node in self.order:
+            if not self.children[node]:
+                x[node] = next_leaf
+                next_leaf += x_spacing
+
+        for node in reversed(self.order):
+            if self.children[node]:
+                x[node] = (x[self.children[node][0]] + x[self.children[node][-1]]) / 2
+
+        return x, y
+
+class OrgTreeView:
+    """
+    The expand / collapse state of a lazily rendered org tree.
+
+    The view starts with the top managers (the largest root subtrees) and only adds
+    the direct reports of a node when it is expanded, so an expansion costs O(children)
+    instead of materializing the whole organization. The state is plain lists, so it
+    can be kept in the Streamlit session state between reruns.
+    """
+    visible: List[int] # node indexes in the order they became visible
+    expanded: List[int]
+
+    def __init__(self, hierarchy: OrgHierarchy, max_roots: int = 50):
+        """
+        Initialize the OrgTreeView.
+
+        Args:
+            hierarchy (OrgHierarchy): The hierarchy to browse
+            max_roots (int): The number of top managers shown initially
+        """
+
+        roots: List[int] = [root for root in hierarchy.roots if hierarchy.children[root]]
+        roots.sort(key=lambda root: hierarchy.subtree_size[root], reverse=True)
+        self.visible = roots[:max_roots]
+        self.expanded = []
+
+    def expand(self, hierarchy: OrgHierarchy, node: int) -> None:
+        """Shows the direct reports of the node."""
+        if node in self.expanded or not hierarchy.children[node]:
+            return
+        self.expanded.append(node)
+        self.visible.extend(hierarchy.children[node])
+
+    def collapse(self, hierarchy: OrgHierarchy, node: int) -> None:
+        """Hides everything below the node."""
+        if node not in self.expanded:
+            return
+        start: int = hierarchy.position[node]
+        end: int = start + hierarchy.subtree_size[node]
+        below = lambda other: other != node and start <= hierarchy.position[other] < end
+        self.visible = [other for other in self.visible if not below(other)]
+        self.expanded = [other for other in self.expanded if other != node and not below(other)]
+
+    def collapsed_managers(self, hierarchy: OrgHierarchy) -> List[int]:
+        """Returns the visible nodes that have direct reports and are not expanded yet."""
+        expanded = set(self.expanded)
+        return [node for node in self.visible if hierarchy.children[node] and node not in expanded]
@@ -3,64 +3,220 @@ Copyright (c) 2024-2025, All rights reserved, Use subject to license terms.
 Scott Fehrman, scott.fehrman@sailpoint.com
 """
 
+import math
+import numpy as np
 import pydeck
 import pandas as pd
-from typing import Any, List, Dict
-from utilities.coordinates import CoordinatesManager
-from sailpoint.v2025.models.identity import Identity
+import utilities.constants as CONSTANTS
+from typing import List, Optional
+from utilities.coordinates import CoordinatesManager, get_coordinates_manager
+from utilities.store import CodeTable, IdentityStore
+from utilities.transport import compact_records
+from utilities.tracing import traced
 
-def get_pydeck_map(identities: List[Identity]) -> pydeck.Deck:
+UNKNOWN: str = "Unknown"
+MAP_MODES: List[str] = ["columns", "hexagon", "points"]
+MAX_POINTS: int = 20000 # points mode sample, about 500 KB of layer JSON
+
+@traced()
+def get_location_data(store: IdentityStore, coordmgr: Optional[CoordinatesManager] = None) -> pd.DataFrame:
+    """
+    Counts identities per location and joins the coordinates.
+
+    The counting is a single bincount over the location codes of the identity store and
+    the coordinates are joined as a lookup table, one row per distinct location.
+    Locations without coordinates are combined into an "Unknown" row at 0.0, 0.0.
+
+    Args:
+        store (IdentityStore): The compact identity store (see utilities.store)
+        coordmgr (Optional[CoordinatesManager]): The coordinates manager, defaults to the shared one
+
+    Returns:
+        pd.DataFrame: The columns City, Qty (int32), Latitude and Longitude (float32)
+    """
+
+    coordmgr = coordmgr or get_coordinates_manager()
+    counts: np.ndarray = store.location.counts()
+    present: np.ndarray = np.flatnonzero(counts > 0)
+
+    cities: List[str] = [store.location.categories[code] for code in present]
+    coordinates = coordmgr.get_many(cities)
+    lookup = pd.DataFrame(
+        [(city, lat, lon) for city, (lat, lon) in coordinates.items()],
+        columns=["City", "Latitude", "Longitude"],
+    )
+
+    map_data = pd.DataFrame({"City": cities, "Qty": counts[present].astype(np.int32)})
+    map_data = map_data.merge(lookup, on="City", how="left")
+
+    unresolved = map_data["Latitude"].isna()
+    if unresolved.any():
+        unknown = pd.DataFrame({"City": [UNKNOWN], "Qty": [map_data.loc[unresolved, "Qty"].sum()], "Latitude": [0.0], "Longitude": [0.0]})
+        map_data = pd.concat([map_data[~unresolved], unknown], ignore_index=True)
+
+    return map_data.astype({"City": "object", "Qty": "int32", "Latitude": "float32", "Longitude": "float32"})
+
+@traced()
+def get_breakdown_data(store: IdentityStore, map_data: pd.DataFrame, attr: str, offset: float = 0.6) -> pd.DataFrame:
+    """
+    Counts identities per location and attribute value (e.g. department) for a breakdown layer.
+
+    The pairs of location and value codes are counted with one bincount. Each value is
+    placed on a small circle around its city, at an angle given by the category code,
+    so the same department always sits at the same spot in every city.
+
+    Args:
+        store (IdentityStore): The compact identity store (see utilities.store)
+        map_data (pd.DataFrame): The location data from get_location_data
+        attr (str): CONSTANTS.DEPARTMENT, CONSTANTS.LOCATION or CONSTANTS.TITLE
+        offset (float): The radius of the circle in degrees
+
+    Returns:
+        pd.DataFrame: The columns City, Value, Qty, Latitude, Longitude and Color
+    """
+
+    values: CodeTable = store.attribute(attr)
+    locations: CodeTable = store.location
+    known = (locations.codes >= 0) & (values.codes >= 0)
+    pairs = locations.codes[known].astype(np.int64) * len(values.categories) + values.codes[known]
+    pair_counts = np.bincount(pairs, minlength=len(locations.categories) * len(values.categories))
+    present = np.flatnonzero(pair_counts > 0)
+    city_codes, codes = np.divmod(present, max(len(values.categories), 1))
+
+    counts = pd.DataFrame({
+        "City": [locations.categories[code] for code in city_codes],
+        "Value": [values.categories[code] for code in codes],
+        "Qty": pair_counts[present].astype(np.int32),
+        "Code": codes,
+    })
+    counts = counts.merge(map_data[map_data["City"] != UNKNOWN][["City", "Latitude", "Longitude"]], on="City", how="inner")
+
+    codes = counts.pop("Code").to_numpy()
+    angle = codes * (2 * math.pi / max(len(values.categories), 1))
+    counts["Latitude"] = (counts["Latitude"] + offset * np.sin(angle)).astype("float32")
+    counts["Longitude"] = (counts["Longitude"] + offset * np.cos(angle)).astype("float32")
+    palette = [hex_to_rgb(color) for color in CONSTANTS.SPTK_WHITEBG_COLORS]
+    counts["Color"] = [palette[code % len(palette)] for code in codes]
+    return counts
+
+@traced()
+def get_identity_positions(map_data: pd.DataFrame, limit: int = MAX_POINTS, spread: float = 0.15, seed: int = 0) -> np.ndarray:
+    """
+    Places up to limit points near the cities, one per identity for small tenants.
+
+    The points are random positions on a small disc around each city, so a bounded
+    sample looks the same as one point per identity: every city gets a share of the
+    points proportional to its identities (at least one), and the payload sent to the
+    browser stays the same size however large the tenant is.
+
+    Args:
+        map_data (pd.DataFrame): The location data from get_location_data
+        limit (int): The maximum number of points
+        spread (float): The radius of the disc in degrees
+        seed (int): The random seed, the same seed places the points the same way
+
+    Returns:
+        np.ndarray: A float32 [n, 2] array of (longitude, latitude), n <= limit plus one per city
+    """
+
+    resolved = map_data[map_data["City"] != UNKNOWN]
+    counts = resolved["Qty"].to_numpy(dtype=np.int64)
+    total = int(counts.sum())
+    if total > limit:
+        counts = np.maximum(counts * limit // total, 1)
+    positions = np.repeat(resolved[["Longitude", "Latitude"]].to_numpy(dtype=np.float64), counts, axis=0)
+
+    rng = np.random.default_rng(seed)
+    radius = spread * np.sqrt(rng.random(len(positions)))
+    angle = rng.random(len(positions)) * 2 * math.pi
+    positions[:, 0] += radius * np.cos(angle)
+    positions[:, 1] += radius * np.sin(angle)
+    return positions.astype(np.float32)
+
+@traced()
+def get_pydeck_map(store: IdentityStore, breakdown: Optional[str] = None, mode: str = "columns",
+                   coordmgr: Optional[CoordinatesManager] = None) -> pydeck.Deck:
     """
     Creates a pydeck map visualization of the identities.
-    
+
     This function generates a pydeck map visualization of the identities,
     including a column layer for the locations and a view state for the map.
+    An optional breakdown layer adds a thinner column per attribute value (e.g.
+    department) around each city. Layer data is sent as compact records (see
+    utilities.transport) to keep the JSON payload small.
+
+    Args:
+        store (IdentityStore): The compact identity store (see utilities.store)
+        breakdown (Optional[str]): An attribute to break each location down by, e.g. CONSTANTS.DEPARTMENT
+        mode (str): "columns" for one column per city, "hexagon" for hexagon bins aggregated in the
+            browser from weighted city points, "points" for dots around each city (up to MAX_POINTS)
+        coordmgr (Optional[CoordinatesManager]): The coordinates manager, defaults to the shared one
     """
 
-    coordmgr: CoordinatesManager = CoordinatesManager()
-    lat: float = 0.0
-    lon: float = 0.0
     deck: pydeck.Deck
-    identity: Identity
-    attributes_dict: Dict[str, Any] = {}
-    attr_location: str
-    location_dict: Dict[str, dict] = {} # {location: {City: ABC, Qty: 0, Latitude: 0.0, Longitude: 0.0}}
     map_data: pd.DataFrame
-    column_layer: pydeck.Layer
+    layers: List[pydeck.Layer] = []
     view_state: pydeck.ViewState
 
-    for identity in identities:
-        if identity.attributes:
-            attributes_dict = identity.attributes
-            if attributes_dict.get("location"):
-                attr_location = str(attributes_dict.get("location"))
-                if attr_location:
-                    if attr_location not in location_dict:
-                        lat, lon = coordmgr.get(attr_location)
-                        location_dict[attr_location] = {"City": attr_location, "Qty": 1, "Latitude": lat, "Longitude": lon}
-                    else:
-                        location_dict[attr_location]["Qty"] += 1
-                else:
-                    attr_location = "Unknown"
-                    location_dict[attr_location] = {"City": attr_location, "Qty": 1, "Latitude": 0.0, "Longitude": 0.0}
-        else:
-            print(f"WARNING: Identity {identity.id} has no attributes.")
-
-    map_data = pd.DataFrame(location_dict).T
-    map_data["Radius"] = map_data["Qty"] * 1000
-    map_data["Elevation"] = map_data["Qty"] * 1000
-
-    column_layer = pydeck.Layer(
-        "ColumnLayer",
-        data=map_data,
-        get_position=["Longitude", "Latitude"],
-        get_elevation="Elevation",
-        elevation_scale=50,
-        radius=20000,
-        get_fill_color=[102, 204, 0],
-        auto_highlight=True,
-        pickable=True,
-    )
+    tooltip: Optional[dict] = {"text": "{q} employees in {l}"}
+
+    map_data = get_location_data(store, coordmgr)
+
+    if mode == "hexagon":
+        layers.append(pydeck.Layer(
+            "HexagonLayer",
+            data=compact_records({"p": map_data[["Longitude", "Latitude"]].to_numpy(), "q": map_data["Qty"]}),
+            get_position="p",
+            get_elevation_weight="q",
+            get_color_weight="q",
+            elevation_aggregation="SUM",
+            color_aggregation="SUM",
+            radius=50000,
+            elevation_scale=50,
+            extruded=True,
+            auto_highlight=True,
+            pickable=True,
+        ))
+        tooltip = {"text": "{elevationValue} employees"}
+    elif mode == "points":
+        layers.append(pydeck.Layer(
+            "ScatterplotLayer",
+            data=compact_records({"p": get_identity_positions(map_data)}, decimals=4),
+            get_position="p",
+            get_radius=3,
+            radius_units="pixels",
+            get_fill_color=[102, 204, 0, 160],
+        ))
+        tooltip = None
+    else:
+        layers.append(pydeck.Layer(
+            "ColumnLayer",
+            data=compact_records({"p": map_data[["Longitude", "Latitude"]].to_numpy(), "e": map_data["Qty"].astype("int64") * 1000,
+                                  "q": map_data["Qty"], "l": map_data["City"]}),
+            get_position="p",
+            get_elevation="e",
+            elevation_scale=50,
+            radius=20000,
+            get_fill_color=[102, 204, 0],
+            auto_highlight=True,
+            pickable=True,
+        ))
+
+    if breakdown and mode == "columns":
+        breakdown_data = get_breakdown_data(store, map_data, breakdown)
+        layers.append(pydeck.Layer(
+            "ColumnLayer",
+            data=compact_records({"p": breakdown_data[["Longitude", "Latitude"]].to_numpy(), "e": breakdown_data["Qty"].astype("int64") * 1000,
+                                  "q": breakdown_data["Qty"], "l": breakdown_data["Value"] + " in " + breakdown_data["City"],
+                                  "c": breakdown_data["Color"]}),
+            get_position="p",
+            get_elevation="e",
+            elevation_scale=50,
+            radius=8000,
+            get_fill_color="c",
+            auto_highlight=True,
+            pickable=True,
+        ))
 
     view_state = pydeck.ViewState(
         latitude=30,
@@ -73,10 +229,14 @@ def get_pydeck_map(identities: List[Identity]) -> pydeck.Deck:
     )
 
     deck = pydeck.Deck(
-        column_layer,
+        layers,
         initial_view_state=view_state,
         map_style="mapbox://styles/mapbox/light-v9",
-        tooltip={"text": "{Qty} employees in {City}"}, # type: ignore
+        tooltip=tooltip if tooltip else False, # type: ignore
     )
 
-    return deck
\ No newline at end of file
+    return deck
+
+def hex_to_rgb(color: str) -> List[int]:
+    """Converts a "#RRGGBB" color into an [r, g, b] list for deck.gl."""
+    return [int(color[i:i + 2], 16) for i in (1, 3, 5)]
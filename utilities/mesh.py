@@ -0,0 +1,149 @@
+"""
+Copyright (c) 2024-2025, All rights reserved, Use subject to license terms.
+Scott Fehrman, scott.fehrman@sailpoint.com
+"""
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+import utilities.constants as CONSTANTS
+from typing import Optional
+from utilities.tracing import traced
+
+ACCESS_KEY: str = "access_key"
+JACCARD: str = "jaccard"
+OUTLIER_SCORE: str = "outlier_score"
+
+class AccessMesh:
+    """
+    The bipartite identity to access graph as a sparse matrix.
+
+    Rows are identities (the node indexes of the identity frame), columns are access
+    items (roles, access profiles, entitlements, accounts); a cell is 1 when the
+    identity holds the access. The matrix is stored in CSR, so memory and every
+    product below scale with the number of identity-access edges, not with
+    identities x access items.
+    """
+    matrix: sp.csr_matrix # identities x access, binary
+    access: pd.DataFrame # one row per column: access_key, access_type, access_id, access_name
+    degree: np.ndarray # access items per identity
+
+    def __init__(self, df: pd.DataFrame, access: pd.DataFrame):
+        """
+        Initialize the AccessMesh.
+
+        Args:
+            df (pd.DataFrame): The identity frame (see utilities.frames), defines the rows
+            access (pd.DataFrame): The access rows (see utilities.collector.get_access_frame)
+        """
+
+        rows = pd.Index(df[CONSTANTS.ID]).get_indexer(access[CONSTANTS.ID])
+        known = rows >= 0
+        access = access[known]
+        keys = access["access_type"].astype(str) + ":" + access["access_id"].astype(str)
+        columns, uniques = pd.factorize(keys)
+
+        matrix = sp.csr_matrix((np.ones(len(columns), dtype=np.float32), (rows[known], columns)), shape=(len(df), len(uniques)))
+        matrix.sum_duplicates()
+        matrix.data[:] = 1.0 # an access held twice (e.g. from two sources) counts once
+        self.matrix = matrix
+
+        first = pd.Series(np.arange(len(columns))).groupby(columns).first().to_numpy()
+        self.access = pd.DataFrame({
+            ACCESS_KEY: uniques,
+            "access_type": access["access_type"].astype(str).to_numpy()[first],
+            "access_id": access["access_id"].to_numpy()[first],
+            "access_name": access["access_name"].fillna(access["access_id"]).to_numpy()[first],
+        })
+        self.degree = np.diff(matrix.indptr)
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+    @traced()
+    def peers(self, node: int, top: int = 10) -> pd.DataFrame:
+        """
+        Returns the identities with the most similar access, by Jaccard similarity.
+
+        The intersections with every identity are one sparse matrix-vector product.
+
+        Args:
+            node (int): The node index of the identity
+            top (int): The number of peers
+
+        Returns:
+            pd.DataFrame: The columns node and jaccard, most similar first
+        """
+        intersection = np.asarray((self.matrix @ self.matrix[node].T).todense()).ravel()
+        union = self.degree + self.degree[node] - intersection
+        similarity = np.divide(intersection, union, out=np.zeros(len(union), dtype=np.float64), where=union > 0)
+        similarity[node] = -1.0
+        candidates = np.flatnonzero(similarity > 0)
+        best = candidates[np.argsort(-similarity[candidates], kind="stable")[:top]]
+        return pd.DataFrame({"node": best, JACCARD: similarity[best]})
+
+    @traced()
+    def peer_outliers(self, groups: np.ndarray) -> np.ndarray:
+        """
+        Scores how unusual the access of each identity is within its peer group.
+
+        For every access an identity holds, the share of the other group members that
+        hold it too is looked up in the group x access counts (one sparse product), one
+        lookup per identity-access edge, so the cost stays linear in the edges however
+        large the groups are. The score is 1 minus the average share: 0 when every peer
+        has the same access, 1 when no peer shares any of it.
+
+        Args:
+            groups (np.ndarray): The peer group code per identity (e.g. manager or department), -1 for none
+
+        Returns:
+            np.ndarray: The outlier score per identity, NaN without access or peers
+        """
+        n = len(self)
+        grouped = groups >= 0
+        codes = np.where(grouped, groups, 0)
+        membership = sp.csr_matrix((grouped.astype(np.float32), (codes, np.arange(n))), shape=(int(codes.max(initial=0)) + 1, n))
+        group_counts = (membership @ self.matrix).tocsr() # groups x access, members holding each access
+
+        rows = np.repeat(np.arange(n), self.degree) # the identity of every edge, in CSR order
+        per_edge = np.asarray(group_counts[codes[rows], self.matrix.indices]).ravel() # holders of the edge's access in the identity's group
+        shared = np.bincount(rows, per_edge, minlength=n) - self.degree # minus the identity itself
+        peers = np.asarray(membership.sum(axis=1)).ravel()[codes] - 1
+        denominator = self.degree * peers
+        scores = np.full(n, np.nan)
+        valid = grouped & (denominator > 0)
+        scores[valid] = 1.0 - shared[valid] / denominator[valid]
+        return scores
+
+    @traced()
+    def cooccurrence(self, min_count: int = 2, top: Optional[int] = 500) -> pd.DataFrame:
+        """
+        Counts how many identities hold each pair of access items, for role mining.
+
+        The counts are the sparse product AᵀA; only the upper triangle is kept.
+
+        Args:
+            min_count (int): The minimum number of identities holding both
+            top (Optional[int]): Keep the most frequent pairs only, None for all
+
+        Returns:
+            pd.DataFrame: The columns source, target (access keys), count and jaccard, most frequent first
+        """
+        product = (self.matrix.T @ self.matrix).tocoo()
+        keep = (product.row < product.col) & (product.data >= min_count)
+        rows, cols, counts = product.row[keep], product.col[keep], product.data[keep].astype(np.int64)
+        holders = np.asarray(self.matrix.sum(axis=0)).ravel()
+        order = np.argsort(-counts, kind="stable")[:top]
+        rows, cols, counts = rows[order], cols[order], counts[order]
+        keys = self.access[ACCESS_KEY].to_numpy()
+        return pd.DataFrame({
+            "source": keys[rows],
+            "target": keys[cols],
+            "count": counts,
+            JACCARD: counts / (holders[rows] + holders[cols] - counts),
+        })
+
+def get_peer_groups(df: pd.DataFrame, by: str) -> np.ndarray:
+    """Returns the peer group code per identity, grouping by CONSTANTS.MANAGER_ID or an attribute; -1 when missing."""
+    codes, _ = pd.factorize(df[by].astype("object"))
+    return codes
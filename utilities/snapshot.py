@@ -0,0 +1,261 @@
+"""
+Copyright (c) 2024-2025, All rights reserved, Use subject to license terms.
+Scott Fehrman, scott.fehrman@sailpoint.com
+"""
+
+import hashlib
+import json
+import sqlite3
+import time
+from contextlib import closing
+from datetime import datetime, timezone
+from typing import Callable, List, Optional, Tuple
+from sailpoint.v2025.api.search_api import SearchApi
+from sailpoint.v2025.exceptions import ApiException
+from sailpoint.v2025.models.search import Search
+from sailpoint.v2025.models.identity import Identity
+from utilities.loader import IdentityLoader
+from utilities.tracing import traced
+
+DELTA_BATCH: int = 50 # identity ids per "id in (...)" list request
+SEARCH_PAGE: int = 10000 # maximum search page, further pages use searchAfter
+
+class IdentitySnapshot:
+    """
+    Persists the identities of a tenant in a local SQLite snapshot.
+
+    This class serves identities from the snapshot while it is younger than the TTL.
+    Once the TTL expires only the identities modified since the last sync are fetched
+    (found with the search API) and merged into the snapshot. A delta cannot see
+    identities deleted from the tenant,
+    so a full crawl, which replaces the snapshot, runs on the first load, after the
+    snapshot has been invalidated and whenever the last full crawl is older than the
+    reconcile interval.
+    """
+    tenant: str
+    db_file: str
+    ttl: float
+    reconcile: float
+    lock_timeout: float
+
+    def __init__(self, tenant: str, db_file: str = 'identities.db', ttl: float = 300.0, reconcile: float = 86400.0,
+                 lock_timeout: float = 900.0):
+        """
+        Initialize the IdentitySnapshot.
+
+        Args:
+            tenant (str): The key for the snapshot, typically the tenant base URL
+            db_file (str): The path to the SQLite database file
+            ttl (float): Seconds the snapshot is served without contacting the tenant
+            reconcile (float): Seconds between full crawls that drop deleted identities
+            lock_timeout (float): Seconds after which the refresh lock of a crashed process is taken over
+        """
+
+        self.tenant = tenant
+        self.db_file = db_file
+        self.ttl = ttl
+        self.reconcile = reconcile
+        self.lock_timeout = lock_timeout
+        self._create_tables()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection, WAL mode lets readers run while a refresh is writing."""
+        conn = sqlite3.connect(self.db_file, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _create_tables(self) -> None:
+        """Create the snapshot tables if they do not exist."""
+        with closing(self._connect()) as conn, conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS identities (
+                tenant TEXT NOT NULL, id TEXT NOT NULL, modified TEXT, body TEXT NOT NULL,
+                PRIMARY KEY (tenant, id))""")
+            conn.execute("""CREATE TABLE IF NOT EXISTS sync (
+                tenant TEXT PRIMARY KEY, last_modified TEXT, checked_at REAL NOT NULL, full_at REAL)""")
+            conn.execute("""CREATE TABLE IF NOT EXISTS refresh_lock (
+                tenant TEXT PRIMARY KEY, started_at REAL NOT NULL)""")
+            if "full_at" not in [column[1] for column in conn.execute("PRAGMA table_info(sync)")]: # snapshots from before reconciling
+                conn.execute("ALTER TABLE sync ADD COLUMN full_at REAL")
+
+    def _get_sync(self) -> Tuple[Optional[str], Optional[float], Optional[float]]:
+        """Returns the newest stored modified timestamp, the time of the last check and of the last full crawl."""
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT last_modified, checked_at, full_at FROM sync WHERE tenant = ?", (self.tenant,)).fetchone()
+        return (row[0], row[1], row[2]) if row else (None, None, None)
+
+    def _store(self, identities: List[Identity], full: bool) -> None:
+        """Upsert identities and record the sync; a full load replaces the previous snapshot."""
+        rows = [(self.tenant, identity.id, _timestamp(identity.modified), _body(identity)) for identity in identities if identity.id]
+
+        with closing(self._connect()) as conn, conn:
+            if full:
+                conn.execute("DELETE FROM identities WHERE tenant = ?", (self.tenant,))
+                full_at = time.time()
+            else:
+                row = conn.execute("SELECT full_at FROM sync WHERE tenant = ?", (self.tenant,)).fetchone()
+                full_at = row[0] if row else None
+            conn.executemany("INSERT OR REPLACE INTO identities (tenant, id, modified, body) VALUES (?, ?, ?, ?)", rows)
+            last_modified = conn.execute("SELECT MAX(modified) FROM identities WHERE tenant = ?", (self.tenant,)).fetchone()[0]
+            conn.execute("INSERT OR REPLACE INTO sync (tenant, last_modified, checked_at, full_at) VALUES (?, ?, ?, ?)",
+                         (self.tenant, last_modified, time.time(), full_at))
+
+    @traced()
+    def read(self) -> List[Identity]:
+        """Returns every identity in the snapshot."""
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT id, body FROM identities WHERE tenant = ?", (self.tenant,)).fetchall()
+        identities = [Identity.from_json(body) for (_, body) in rows]
+        for identity, (id, _) in zip(identities, rows):
+            identity.id = identity.id or id # rows written before the body kept the id
+        return identities
+
+    def version(self) -> str:
+        """
+        Returns the dataset version of the snapshot.
+
+        The version only changes when a refresh brought in new or modified identities,
+        so results cached per version survive refreshes without changes.
+        """
+        with closing(self._connect()) as conn:
+            count, last_modified = conn.execute("SELECT COUNT(*), MAX(modified) FROM identities WHERE tenant = ?", (self.tenant,)).fetchone()
+        return hashlib.sha1(f"{self.tenant}|{count}|{last_modified}".encode()).hexdigest()[:16]
+
+    def is_fresh(self) -> bool:
+        """Returns True when the snapshot was checked against the tenant within the TTL."""
+        _, checked_at, _ = self._get_sync()
+        return checked_at is not None and (time.time() - checked_at) < self.ttl
+
+    def invalidate(self) -> None:
+        """Drops the snapshot for the tenant, the next load performs a full crawl."""
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM identities WHERE tenant = ?", (self.tenant,))
+            conn.execute("DELETE FROM sync WHERE tenant = ?", (self.tenant,))
+
+    @traced()
+    def refresh(self, list_fn: Callable[..., List[Identity]], on_page: Optional[Callable[[int], None]] = None,
+                search_api: Optional[SearchApi] = None, **loader_kwargs) -> int:
+        """
+        Brings the snapshot up to date with the tenant.
+
+        With a search API, the ids of the identities modified since the last sync are
+        searched (list_identities cannot filter on modified) and only those identities
+        are fetched, by id. Without one, or once the reconcile interval has passed, the
+        tenant is crawled in full. Only one process refreshes a tenant at a time, the
+        others wait for it and then serve its result.
+
+        Args:
+            list_fn (Callable): The list function, e.g. IdentitiesApi.list_identities
+            on_page (Optional[Callable]): Called with the running count after every page
+            search_api (Optional[SearchApi]): The search API used for delta refreshes
+            loader_kwargs: Extra arguments for the IdentityLoader (workers, max_results, ...)
+
+        Returns:
+            int: The number of identities fetched from the tenant, 0 when another process refreshed
+        """
+        if not self._claim():
+            return 0
+
+        try:
+            last_modified, checked_at, full_at = self._get_sync()
+            full: bool = (search_api is None or not last_modified or checked_at is None or full_at is None
+                          or time.time() - full_at >= self.reconcile)
+            fetched: List[Identity] = []
+
+            if not full:
+                try:
+                    ids = _modified_ids(search_api, last_modified)
+                except ApiException as e:
+                    if e.status not in (400, 403):
+                        raise
+                    print(f"... Notice: identity search failed ({e.status}), performing a full refresh ...")
+                    full = True
+                else:
+                    for start in range(0, len(ids), DELTA_BATCH):
+                        batch = ", ".join(f'"{identity_id}"' for identity_id in ids[start:start + DELTA_BATCH])
+                        fetched.extend(self._fetch(list_fn, None, filters=f"id in ({batch})", workers=1))
+                        if on_page:
+                            on_page(len(fetched))
+
+            if full:
+                fetched = self._fetch(list_fn, on_page, **loader_kwargs)
+
+            self._store(fetched, full)
+            return len(fetched)
+        finally:
+            self._release()
+
+    def _claim(self) -> bool:
+        """
+        Takes the refresh lock of the tenant, waiting while another process holds it.
+
+        Returns False when the other process finished a refresh in the meantime. A lock
+        older than lock_timeout is taken over, its process is assumed dead.
+        """
+        while True:
+            with closing(self._connect()) as conn:
+                conn.execute("BEGIN IMMEDIATE") # serializes the check and the claim between processes
+                row = conn.execute("SELECT started_at FROM refresh_lock WHERE tenant = ?", (self.tenant,)).fetchone()
+                if row is None or time.time() - row[0] >= self.lock_timeout:
+                    conn.execute("INSERT OR REPLACE INTO refresh_lock (tenant, started_at) VALUES (?, ?)", (self.tenant, time.time()))
+                    conn.execute("COMMIT")
+                    return True
+                conn.execute("ROLLBACK")
+            time.sleep(0.5)
+            if self.is_fresh():
+                return False
+
+    def _release(self) -> None:
+        """Releases the refresh lock of the tenant."""
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM refresh_lock WHERE tenant = ?", (self.tenant,))
+
+    def _fetch(self, list_fn: Callable[..., List[Identity]], on_page: Optional[Callable[[int], None]], **loader_kwargs) -> List[Identity]:
+        """Load identities with the IdentityLoader, reporting progress per page."""
+        identities: List[Identity] = []
+        for page in IdentityLoader(list_fn, **loader_kwargs).pages():
+            identities.extend(page)
+            if on_page:
+                on_page(len(identities))
+        return identities
+
+    def load(self, list_fn: Callable[..., List[Identity]], on_page: Optional[Callable[[int], None]] = None, **loader_kwargs) -> List[Identity]:
+        """
+        Returns the identities of the tenant, refreshing the snapshot when the TTL has expired.
+        """
+        if not self.is_fresh():
+            self.refresh(list_fn, on_page, **loader_kwargs)
+        return self.read()
+
+def _modified_ids(search_api: SearchApi, since: str) -> List[str]:
+    """Returns the ids of the identities modified at or after since, paging with searchAfter."""
+    ids: List[str] = []
+    search_after: Optional[List[str]] = None
+    while True:
+        search = Search.from_dict({
+            "indices": ["identities"],
+            "queryType": "DSL",
+            "queryDsl": {"range": {"modified": {"gte": since}}},
+            "queryResultFilter": {"includes": ["id"]},
+            "sort": ["id"],
+            "searchAfter": search_after,
+        })
+        response = search_api.search_post_without_preload_content(search, limit=SEARCH_PAGE)
+        if response.status >= 400:
+            raise ApiException(status=response.status, reason=response.reason)
+        page = [document["id"] for document in json.loads(response.data)]
+        ids.extend(page)
+        if len(page) < SEARCH_PAGE:
+            return ids
+        search_after = [page[-1]]
+
+def _body(identity: Identity) -> str:
+    """Serializes an identity with its read only fields, Identity.to_json drops id, created and modified."""
+    return identity.model_dump_json(by_alias=True, exclude_none=True)
+
+def _timestamp(value: Optional[datetime]) -> Optional[str]:
+    """Format a modified timestamp as a sortable UTC ISO 8601 string."""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
@@ -4,11 +4,16 @@ Scott Fehrman, scott.fehrman@sailpoint.com
 SailPoint ToolKit: SPTK
 """
 
-from typing import List
+import base64
+import json
+import threading
+import time
+from typing import List, Optional, Tuple
 from sailpoint.configuration import Configuration
 from sailpoint.v2025.api_client import ApiClient
 from sailpoint.v2025.api.managed_clusters_api import ManagedClustersApi
 from sailpoint.v2025.api.identities_api import IdentitiesApi
+from sailpoint.v2025.api.search_api import SearchApi
 from sailpoint.v2025.models.managed_cluster import ManagedCluster
 
 class SPTKService:
@@ -18,17 +23,35 @@ class SPTKService:
     This class provides a service for initializing and managing the SailPoint ToolKit
     configuration and API client. It handles the initialization of the configuration,
     the creation of the API client, and the validation of the API client.
+
+    The service is shared by every Streamlit session, so all state changes happen under
+    a lock. One API client with a connection pool sized for concurrent page fetches is
+    reused (keep-alive), the OAuth token is renewed shortly before it expires, and the
+    health check runs at most once per health interval instead of before every use.
     """
     config: Configuration
     api_client: ApiClient
+    pool_size: int
+    token_margin: float
+    health_interval: float
 
-    def __init__(self):
+    def __init__(self, pool_size: int = 16, token_margin: float = 60.0, health_interval: float = 300.0):
         """
         Initializes the SPTKService.
         
         This constructor initializes the configuration and API client for the SPTK service.
         It sets the experimental flag to True and creates an API client using the configuration.
+
+        Args:
+            pool_size (int): The maximum number of pooled HTTP connections, at least the loader workers
+            token_margin (float): Seconds before the token expiry at which a new token is requested
+            health_interval (float): Minimum seconds between two health checks
         """
+        self.pool_size = pool_size
+        self.token_margin = token_margin
+        self.health_interval = health_interval
+        self._lock = threading.RLock()
+        self._checked_at: float = 0.0
         self.__initialize()
 
     def __initialize(self) -> None:
@@ -40,34 +63,93 @@ class SPTKService:
         """
         self.config = Configuration()
         self.config.experimental = True
+        self.config.connection_pool_maxsize = self.pool_size
         self.api_client = ApiClient(self.config)
+        self._token_expires = _token_expiry(getattr(self.config, "access_token", None))
+        self._checked_at = time.monotonic() # a new client has just obtained a token
+
+    def __refresh_token(self) -> None:
+        """
+        Renews the OAuth token when it is about to expire.
+
+        A new Configuration requests a new token, only the token is copied so the API
+        client and its pooled connections are kept.
+        """
+        if self._token_expires is None or time.time() < self._token_expires - self.token_margin:
+            return
+        fresh: Configuration = Configuration()
+        self.config.access_token = fresh.access_token
+        self._token_expires = _token_expiry(fresh.access_token)
 
     def __validate(self) -> None:
         """
         Validates the API client.
         
-        This method validates the API client by attempting to retrieve managed clusters.
-        If an exception occurs, it reinitializes the API client.
+        This method validates the API client by retrieving a single managed cluster, at
+        most once per health interval. If an exception occurs, it reinitializes the API client.
         """
+        if time.monotonic() - self._checked_at < self.health_interval:
+            return
         try:
             clusters: ManagedClustersApi = ManagedClustersApi(self.api_client)
-            records: List[ManagedCluster] = clusters.get_managed_clusters()
+            records: List[ManagedCluster] = clusters.get_managed_clusters(limit=1)
+            self._checked_at = time.monotonic()
         except Exception as e:
             print(f"... Error: {e} ... re-initializing ...")
             self.__initialize()
-        
+
     def get_identities_api(self) -> IdentitiesApi:
         """
         Retrieves the Identities API.
         
-        This method retrieves the Identities API by validating the API client and returning
-        an instance of the IdentitiesApi class.
+        This method retrieves the Identities API by renewing the token when needed,
+        validating the API client when the health interval has passed and returning
+        an instance of the IdentitiesApi class on the shared, pooled API client.
+        """
+        with self._lock:
+            self.__refresh_token()
+            self.__validate()
+            return IdentitiesApi(self.api_client)
+
+    def get_search_api(self) -> SearchApi:
         """
-        self.__validate()
-        return IdentitiesApi(self.api_client)
+        Retrieves the Search API.
+
+        Renews the token and validates the API client like get_identities_api and
+        returns an instance of the SearchApi class on the shared, pooled API client.
+        """
+        with self._lock:
+            self.__refresh_token()
+            self.__validate()
+            return SearchApi(self.api_client)
+
+    def get_credentials(self) -> Tuple[str, Optional[str]]:
+        """
+        Retrieves the base URL and a current access token.
+
+        This method is used by clients that do not go through the SDK API client, e.g.
+        utilities.collector.AsyncCollector. The token is renewed first when needed.
+        """
+        with self._lock:
+            self.__refresh_token()
+            return self.config.base_url, self.config.access_token
+
+def _token_expiry(token: Optional[str]) -> Optional[float]:
+    """
+    Returns the expiry (epoch seconds) from the "exp" claim of a JWT access token.
+
+    The token is only decoded, not verified, it is used to schedule the renewal.
+    Returns None when the token is missing or not a JWT.
+    """
+    try:
+        payload: str = token.split(".")[1] # type: ignore
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        return float(claims["exp"])
+    except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+        return None
     
 try:
     sptk_service = SPTKService()
 except ValueError as e:
     print(f"Warning: SailPoint configuration error: {str(e)}")
-    sptk_service = None 
\ No newline at end of file
+    sptk_service = None
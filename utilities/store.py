@@ -0,0 +1,157 @@
+"""
+Copyright (c) 2024-2025, All rights reserved, Use subject to license terms.
+Scott Fehrman, scott.fehrman@sailpoint.com
+"""
+
+import numpy as np
+import pandas as pd
+import utilities.constants as CONSTANTS
+from typing import Dict, Iterable, List, Optional
+
+NO_MANAGER: int = -1
+UNKNOWN_MANAGER: int = -2 # the manager is not in the tenant
+
+class StringTable:
+    """
+    Immutable strings packed into one UTF-8 buffer with an offset array.
+
+    Costs the encoded length plus 8 bytes per string instead of a Python str object each.
+    """
+
+    def __init__(self, values: Iterable[Optional[str]]):
+        encoded: List[bytes] = [value.encode() if isinstance(value, str) else b"" for value in values]
+        self.offsets: np.ndarray = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum(np.fromiter((len(value) for value in encoded), dtype=np.int64, count=len(encoded)), out=self.offsets[1:])
+        self.blob: bytes = b"".join(encoded)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        return self.blob[self.offsets[index]:self.offsets[index + 1]].decode()
+
+    def take(self, indexes: np.ndarray) -> "StringTable":
+        """Returns the strings at the indexes, the bytes are gathered with numpy instead of a loop per string."""
+        starts = self.offsets[indexes]
+        lengths = self.offsets[indexes + 1] - starts
+        subset = StringTable([])
+        subset.offsets = np.zeros(len(indexes) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=subset.offsets[1:])
+        gather = np.repeat(starts - subset.offsets[:-1], lengths) + np.arange(subset.offsets[-1], dtype=np.int64)
+        subset.blob = np.frombuffer(self.blob, dtype=np.uint8)[gather].tobytes()
+        return subset
+
+    def tolist(self) -> List[str]:
+        return [self[index] for index in range(len(self))]
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.blob) + self.offsets.nbytes
+
+class CodeTable:
+    """
+    A categorical column: one small integer code per identity and the list of values.
+
+    Code -1 means the value is missing.
+    """
+
+    def __init__(self, codes: np.ndarray, categories: List[str]):
+        self.codes: np.ndarray = codes.astype(np.int16 if len(categories) < 2**15 else np.int32)
+        self.categories: List[str] = categories
+
+    def __getitem__(self, index: int) -> Optional[str]:
+        code = self.codes[index]
+        return self.categories[code] if code >= 0 else None
+
+    def counts(self) -> np.ndarray:
+        """Returns the number of identities per category in O(n)."""
+        return np.bincount(self.codes[self.codes >= 0], minlength=len(self.categories))
+
+class IdentityStore:
+    """
+    Compact, array backed store of the identity fields used by the graph and map builders.
+
+    Identity ids are interned into integer node indexes: the manager reference becomes
+    the node index of the manager, attributes become category codes and the flags are
+    boolean arrays. Ids and names are packed in string tables. A store costs tens of
+    bytes per identity instead of a full Identity model with its dictionaries.
+    """
+    ids: StringTable
+    names: StringTable
+    parent: np.ndarray # node index of the manager, NO_MANAGER or UNKNOWN_MANAGER
+    is_manager: np.ndarray
+    has_attributes: np.ndarray
+    title: CodeTable
+    department: CodeTable
+    location: CodeTable
+
+    def __init__(self, ids: List[Optional[str]], names: List[Optional[str]], manager_ids: List[Optional[str]],
+                 is_manager: List[bool], has_attributes: List[bool], titles: CodeTable, departments: CodeTable, locations: CodeTable):
+        """
+        Initialize the IdentityStore, use from_frame to build one.
+        """
+
+        index: Dict[str, int] = {identity_id: node for node, identity_id in enumerate(ids) if identity_id}
+        self.parent = np.fromiter(
+            (NO_MANAGER if not isinstance(manager_id, str) or not manager_id else index.get(manager_id, UNKNOWN_MANAGER) for manager_id in manager_ids),
+            dtype=np.int32, count=len(ids))
+        self.ids = StringTable(ids)
+        self.names = StringTable(names)
+        self.is_manager = np.asarray(is_manager, dtype=bool)
+        self.has_attributes = np.asarray(has_attributes, dtype=bool)
+        self.title = titles
+        self.department = departments
+        self.location = locations
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "IdentityStore":
+        """Builds the store from the identity frame (see utilities.frames), reusing its categorical codes."""
+        def codes(column: str) -> CodeTable:
+            values = df[column].astype("category")
+            return CodeTable(values.cat.codes.to_numpy(), [str(value) for value in values.cat.categories])
+
+        def strings(column: str) -> List[Optional[str]]:
+            values = df[column].astype(object)
+            return values.where(values.notna(), None).tolist()
+
+        return cls(strings(CONSTANTS.ID), strings(CONSTANTS.NAME), strings(CONSTANTS.MANAGER_ID),
+                   df[CONSTANTS.IS_MANAGER].tolist(), df[CONSTANTS.HAS_ATTRIBUTES].tolist(),
+                   codes(CONSTANTS.TITLE), codes(CONSTANTS.DEPARTMENT), codes(CONSTANTS.LOCATION))
+
+    def __len__(self) -> int:
+        return len(self.parent)
+
+    def attribute(self, name: str) -> CodeTable:
+        """Returns the code table of CONSTANTS.TITLE, CONSTANTS.DEPARTMENT or CONSTANTS.LOCATION."""
+        tables: Dict[str, CodeTable] = {CONSTANTS.TITLE: self.title, CONSTANTS.DEPARTMENT: self.department, CONSTANTS.LOCATION: self.location}
+        if name not in tables:
+            raise ValueError(f"Unsupported attribute '{name}', expected one of {list(tables)}")
+        return tables[name]
+
+    def take(self, nodes: Iterable[int]) -> "IdentityStore":
+        """
+        Returns a store with the nodes only, in the given order.
+
+        Managers outside the selection become UNKNOWN_MANAGER, like a manager outside the tenant.
+        """
+        selected = np.asarray(nodes if isinstance(nodes, np.ndarray) else list(nodes), dtype=np.int64)
+        remap = np.full(len(self), UNKNOWN_MANAGER, dtype=np.int32)
+        remap[selected] = np.arange(len(selected), dtype=np.int32)
+        parent = self.parent[selected]
+
+        subset = IdentityStore.__new__(IdentityStore)
+        subset.parent = np.where(parent >= 0, remap[np.maximum(parent, 0)], parent).astype(np.int32)
+        subset.ids = self.ids.take(selected)
+        subset.names = self.names.take(selected)
+        subset.is_manager = self.is_manager[selected]
+        subset.has_attributes = self.has_attributes[selected]
+        subset.title = CodeTable(self.title.codes[selected], self.title.categories)
+        subset.department = CodeTable(self.department.codes[selected], self.department.categories)
+        subset.location = CodeTable(self.location.codes[selected], self.location.categories)
+        return subset
+
+    @property
+    def nbytes(self) -> int:
+        """Returns the memory used by the arrays and string tables."""
+        return (self.ids.nbytes + self.names.nbytes + self.parent.nbytes + self.is_manager.nbytes + self.has_attributes.nbytes
+                + self.title.codes.nbytes + self.department.codes.nbytes + self.location.codes.nbytes)
@@ -0,0 +1,119 @@
+"""
+Copyright (c) 2024-2025, All rights reserved, Use subject to license terms.
+Scott Fehrman, scott.fehrman@sailpoint.com
+"""
+
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from geopy.location import Location
+from sailpoint.v2025.models.identity import Identity
+from sailpoint.v2025.models.identity_manager_ref import IdentityManagerRef
+from utilities.coordinates import CoordinatesManager
+
+LOCATIONS: List[str] = ["Austin", "New York", "London", "Berlin", "Tokyo", "Sydney", "Paris", "Toronto",
+                        "Singapore", "Dublin", "Chicago", "Seattle", "Madrid", "Zurich", "Seoul", "Boston"]
+DEPARTMENTS: List[str] = ["Engineering", "Sales", "Marketing", "Finance", "Support", "Legal",
+                          "Human Resources", "Operations", "Product", "IT"]
+TITLES: List[str] = ["Engineer", "Senior Engineer", "Analyst", "Manager", "Director", "Specialist", "Consultant"]
+
+def make_identities(count: int, seed: int = 42) -> List[Identity]:
+    """
+    Generates a synthetic tenant of Identity objects.
+
+    Identities are created breadth first so every manager exists before its reports.
+    Locations and departments follow a Zipf-like skew, so a few values dominate
+    the way they do in real tenants.
+
+    Args:
+        count (int): The number of identities
+        seed (int): The random seed, the same seed produces the same tenant
+
+    Returns:
+        List[Identity]: The identities, the first one is the top of the organization
+    """
+
+    rng: random.Random = random.Random(seed)
+    location_weights: List[float] = [1.0 / (rank + 1) for rank in range(len(LOCATIONS))]
+    department_weights: List[float] = [1.0 / (rank + 1) for rank in range(len(DEPARTMENTS))]
+    created: datetime = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    identities: List[Identity] = []
+    managers: List[Identity] = []
+    manager_index: int = 0
+    reports_left: int = 0
+
+    for index in range(count):
+        manager_ref = None
+        if managers:
+            if reports_left == 0: # move to the next manager, span of control between 2 and 12
+                manager_index = min(manager_index + 1, len(managers) - 1)
+                reports_left = rng.randint(2, 12)
+            manager = managers[manager_index]
+            manager_ref = IdentityManagerRef(type="IDENTITY", id=manager.id, name=manager.name)
+            reports_left -= 1
+
+        identity = Identity(
+            id=f"{index:032x}",
+            name=f"identity.{index}",
+            created=created,
+            modified=created + timedelta(minutes=rng.randint(0, 500_000)),
+            manager_ref=manager_ref,
+            is_manager=index == 0 or rng.random() < 0.15,
+            attributes={
+                "title": rng.choice(TITLES),
+                "department": rng.choices(DEPARTMENTS, weights=department_weights)[0],
+                "location": rng.choices(LOCATIONS, weights=location_weights)[0],
+            },
+        )
+        identities.append(identity)
+        if identity.is_manager:
+            managers.append(identity)
+            if len(managers) == 1:
+                manager_index = 0
+                reports_left = rng.randint(2, 12)
+
+    return identities
+
+class SyntheticIdentitiesApi:
+    """
+    An offline stand-in for IdentitiesApi that pages through a synthetic tenant with a fixed latency per call.
+    """
+
+    def __init__(self, identities: List[Identity], latency: float = 0.0):
+        self.identities = identities
+        self.latency = latency
+        self.calls = 0
+
+    def list_identities(self, offset: int = 0, limit: int = 250, **kwargs) -> List[Identity]:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return self.identities[offset:offset + limit]
+
+class StubGeolocator:
+    """
+    An offline stand-in for Nominatim that answers from a dictionary with a fixed latency.
+    """
+
+    def __init__(self, known: Dict[str, Tuple[float, float]], latency: float = 0.0):
+        self.known = known
+        self.latency = latency
+        self.queries: List[str] = []
+        self._lock = threading.Lock()
+
+    def geocode(self, query: str) -> Optional[Location]:
+        with self._lock:
+            self.queries.append(query)
+        if self.latency:
+            time.sleep(self.latency)
+        if query in self.known:
+            return Location(query, self.known[query], {})
+        return None
+
+def make_coordinates_manager(directory: str) -> CoordinatesManager:
+    """Returns a CoordinatesManager resolving the synthetic LOCATIONS offline, cached in a CSV file in directory."""
+    known = {city: (float(i), float(-i)) for i, city in enumerate(LOCATIONS)}
+    return CoordinatesManager(os.path.join(directory, "coordinates.csv"), geolocator=StubGeolocator(known), min_interval=0.0)
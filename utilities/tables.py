@@ -0,0 +1,143 @@
+"""
+Copyright (c) 2024-2025, All rights reserved, Use subject to license terms.
+Scott Fehrman, scott.fehrman@sailpoint.com
+"""
+
+import math
+import numpy as np
+import pandas as pd
+import streamlit as st
+import utilities.constants as CONSTANTS
+from typing import List, Optional, Tuple
+from sailpoint.v2025.models.identity import Identity
+from utilities.cache import StageCache
+from utilities.frames import get_normalized_frame
+
+# row positions of the tables, one entry per filter and sort; kept apart from the
+# stage cache so that paging through tables never evicts the expensive stages
+table_cache = StageCache(max_entries=8, max_bytes=64 * 2**20)
+
+class TableSource:
+    """
+    Backend for a paginated table.
+
+    Filtering, sorting and paging run on the server; only the visible window of rows
+    is built and handed to Streamlit, so the browser payload does not grow with the
+    size of the tenant. Subclasses decide how a window of rows is materialized.
+    """
+    name: str
+    version: str
+    df: pd.DataFrame # the frame used for filtering and sorting
+
+    def __init__(self, name: str, version: str, df: pd.DataFrame):
+        self.name = name
+        self.version = version
+        self.df = df
+
+    def columns(self) -> List[str]:
+        """Returns the columns that can be displayed."""
+        return list(self.df.columns)
+
+    def key_columns(self) -> List[str]:
+        """Returns the columns that can be used for filtering and sorting."""
+        return list(self.df.columns)
+
+    def rows(self, filter_column: Optional[str], filter_text: str, sort_by: Optional[str], ascending: bool) -> np.ndarray:
+        """
+        Returns the row positions matching the filter in display order, cached per dataset version in the table cache.
+        """
+        def compute() -> np.ndarray:
+            positions = np.arange(len(self.df))
+            if filter_column and filter_text:
+                values = self.df[filter_column].astype("string")
+                positions = np.flatnonzero(values.str.contains(filter_text, case=False, regex=False, na=False).to_numpy())
+            if sort_by:
+                values = self.df[sort_by].iloc[positions].reset_index(drop=True)
+                order = values.sort_values(ascending=ascending, kind="stable", na_position="last").index.to_numpy()
+                positions = positions[order]
+            return positions
+
+        return table_cache.get_or_compute("table_rows", self.version, compute, self.name, filter_column, filter_text, sort_by, ascending)
+
+    def window(self, positions: np.ndarray, columns: List[str]) -> pd.DataFrame:
+        """Returns the rows at the positions, projected to the columns."""
+        return self.df.iloc[positions][columns]
+
+class NormalizedSource(TableSource):
+    """
+    Table of every identity field, normalized one window at a time.
+
+    The rows are filtered and sorted on the identity frame (same order as the
+    identities), then only the identities of the visible window are normalized.
+    The identities must be the ones the frame was built from, row for row.
+    """
+    identities: List[Identity]
+
+    def __init__(self, name: str, version: str, df: pd.DataFrame, identities: List[Identity], sample: int = 200):
+        super().__init__(name, version, df)
+        ids = np.array([identity.id for identity in identities], dtype=object)
+        if not np.array_equal(ids, df[CONSTANTS.ID].to_numpy(dtype=object, na_value=None)):
+            raise ValueError(f"... Warning: the identities do not match the frame of version {version} ...")
+        self.identities = identities
+        self._columns: List[str] = list(get_normalized_frame(identities[:sample]).columns)
+
+    def columns(self) -> List[str]:
+        return self._columns
+
+    def window(self, positions: np.ndarray, columns: List[str]) -> pd.DataFrame:
+        normalized = get_normalized_frame([self.identities[position] for position in positions])
+        return normalized.reindex(columns=columns).set_index(pd.Index(positions))
+
+def query_table(source: TableSource, columns: List[str], filter_column: Optional[str] = None, filter_text: str = "",
+                sort_by: Optional[str] = None, ascending: bool = True, page: int = 1, page_size: int = 100) -> Tuple[pd.DataFrame, int]:
+    """
+    Returns one page of a table and the number of matching rows.
+
+    Args:
+        source (TableSource): The table backend
+        columns (List[str]): The columns to return
+        filter_column (Optional[str]): The column the filter text is searched in
+        filter_text (str): Case insensitive text the filter column must contain
+        sort_by (Optional[str]): The column to sort by
+        ascending (bool): The sort direction
+        page (int): The page number, starting at 1
+        page_size (int): The number of rows per page
+
+    Returns:
+        Tuple[pd.DataFrame, int]: The page and the total number of matching rows
+    """
+    positions = source.rows(filter_column, filter_text.strip(), sort_by, ascending)
+    start = (max(page, 1) - 1) * page_size
+    return source.window(positions[start:start + page_size], columns), len(positions)
+
+def render_table(source: TableSource, key: str, default_columns: Optional[List[str]] = None, page_size: int = 100) -> None:
+    """
+    Renders a paginated, filterable and sortable table in Streamlit.
+
+    Args:
+        source (TableSource): The table backend
+        key (str): A unique prefix for the widget keys
+        default_columns (Optional[List[str]]): The initially displayed columns, defaults to all
+        page_size (int): The initial number of rows per page
+    """
+    all_columns = source.columns()
+    key_columns = source.key_columns()
+    columns = st.multiselect("Columns", all_columns, default=default_columns or all_columns, key=f"{key}_columns")
+
+    col_filter, col_text, col_sort, col_order, col_size = st.columns([2, 3, 2, 1, 1])
+    filter_column = col_filter.selectbox("Filter column", key_columns, key=f"{key}_filter_column")
+    filter_text = col_text.text_input("Contains", key=f"{key}_filter_text")
+    sort_by = col_sort.selectbox("Sort by", key_columns, index=None, key=f"{key}_sort_by")
+    ascending = col_order.radio("Order", ["Asc", "Desc"], key=f"{key}_order") == "Asc"
+    page_size = col_size.selectbox("Rows", [25, 50, 100, 250, 500], index=[25, 50, 100, 250, 500].index(page_size) if page_size in (25, 50, 100, 250, 500) else 2, key=f"{key}_page_size")
+
+    total = len(source.rows(filter_column, filter_text.strip(), sort_by, ascending))
+    pages = max(1, math.ceil(total / page_size))
+    if st.session_state.get(f"{key}_page", 1) > pages: # the filter shrank the table
+        st.session_state[f"{key}_page"] = 1
+    page = st.number_input(f"Page (of {pages:,})", min_value=1, max_value=pages, step=1, key=f"{key}_page")
+
+    window, total = query_table(source, columns, filter_column, filter_text, sort_by, ascending, int(page), page_size)
+    st.dataframe(window)
+    first = (int(page) - 1) * page_size
+    st.caption(f"Rows {min(first + 1, total):,} - {min(first + page_size, total):,} of {total:,}")
@@ -0,0 +1,156 @@
+"""
+Copyright (c) 2024-2025, All rights reserved, Use subject to license terms.
+Scott Fehrman, scott.fehrman@sailpoint.com
+"""
+
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+class Trace:
+    """
+    Timing and memory spans recorded during one run of the app.
+
+    A span records its wall time, the peak traced allocation above the memory in use
+    when it started (when memory tracing is on) and the sizes of its inputs. Spans nest,
+    the depth is kept so the trace reads like a call tree. A trace exports as JSON or as
+    a Chrome trace file (chrome://tracing, Perfetto).
+    """
+    memory: bool
+    spans: List[Dict[str, Any]]
+
+    def __init__(self, memory: bool = True):
+        """
+        Initialize the Trace.
+
+        Args:
+            memory (bool): Record the peak allocation per span with tracemalloc, slows the run down
+        """
+
+        self.memory = memory
+        self.spans = []
+        self._origin: float = time.perf_counter()
+        self._stack: List[Dict[str, Any]] = [] # open spans, outermost first
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, **inputs: Any) -> Iterator[Dict[str, Any]]:
+        """Records a span around the block, the yielded record can be annotated with more inputs."""
+        record: Dict[str, Any] = {"name": name, "depth": len(self._stack), "inputs": inputs, "thread": threading.get_ident()}
+
+        with self._lock:
+            if self.memory and tracemalloc.is_tracing():
+                current, peak = tracemalloc.get_traced_memory()
+                for open_span in self._stack: # keep the peaks of the enclosing spans before resetting
+                    open_span["_peak"] = max(open_span["_peak"], peak)
+                tracemalloc.reset_peak()
+                record["_start_memory"] = record["_peak"] = current
+            self._stack.append(record)
+        start = time.perf_counter()
+
+        try:
+            yield record
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._stack.remove(record)
+                record["start"] = start - self._origin
+                record["seconds"] = elapsed
+                if "_start_memory" in record:
+                    _, peak = tracemalloc.get_traced_memory()
+                    for open_span in self._stack:
+                        open_span["_peak"] = max(open_span["_peak"], peak)
+                    record["peak_bytes"] = max(record.pop("_peak"), peak) - record.pop("_start_memory")
+                self.spans.append(record)
+
+    def records(self) -> List[Dict[str, Any]]:
+        """Returns the spans in start order."""
+        return sorted(self.spans, key=lambda record: record["start"])
+
+    def to_json(self) -> str:
+        """Returns the spans as a JSON document."""
+        return json.dumps({"memory": self.memory, "spans": self.records()}, indent=2, default=str)
+
+    def to_chrome_trace(self) -> str:
+        """Returns the spans in the Chrome trace event format, one complete ("X") event per span."""
+        events = [{
+            "name": record["name"],
+            "cat": "stage",
+            "ph": "X",
+            "ts": round(record["start"] * 1e6),
+            "dur": round(record["seconds"] * 1e6),
+            "pid": os.getpid(),
+            "tid": record["thread"],
+            "args": {**record["inputs"], **({"peak_bytes": record["peak_bytes"]} if "peak_bytes" in record else {})},
+        } for record in self.records()]
+        return json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}, default=str)
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+_memory_owner = threading.Lock() # tracemalloc is process wide, one trace at a time records memory
+
+@contextmanager
+def trace_run(memory: bool = True) -> Iterator[Trace]:
+    """
+    Makes a new Trace current for the block, spans opened in this context are recorded in it.
+
+    Streamlit runs every session in its own thread, so concurrent sessions record their
+    timings independently. tracemalloc and its peak are process wide, so only one run at
+    a time traces memory; a run started while another one holds it records timings only
+    (trace.memory is False). The peaks still include allocations of other sessions
+    running at the same time.
+    """
+    owner = memory and _memory_owner.acquire(blocking=False)
+    trace = Trace(owner)
+    token = _current_trace.set(trace)
+    started = owner and not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    try:
+        yield trace
+    finally:
+        if started:
+            tracemalloc.stop()
+        if owner:
+            _memory_owner.release()
+        _current_trace.reset(token)
+
+@contextmanager
+def span(name: str, **inputs: Any) -> Iterator[Optional[Dict[str, Any]]]:
+    """Records a span in the current trace, does nothing when no trace is running."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    with trace.span(name, **inputs) as record:
+        yield record
+
+def traced(name: Optional[str] = None) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """
+    Decorator that records a span around every call, with the length of each sized argument as input size.
+
+    Args:
+        name (Optional[str]): The span name, defaults to the qualified function name
+    """
+    def decorator(fn: Callable[..., Any]) -> Callable[..., Any]:
+        signature = inspect.signature(fn)
+        span_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _current_trace.get() is None:
+                return fn(*args, **kwargs)
+            bound = signature.bind_partial(*args, **kwargs)
+            inputs = {key: len(value) for key, value in bound.arguments.items()
+                      if key != "self" and hasattr(value, "__len__") and not isinstance(value, (str, bytes))}
+            with span(span_name, **inputs):
+                return fn(*args, **kwargs)
+
+        return wrapper
+    return decorator
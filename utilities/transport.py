@@ -0,0 +1,42 @@
+"""
+Copyright (c) 2024-2025, All rights reserved, Use subject to license terms.
+Scott Fehrman, scott.fehrman@sailpoint.com
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Union
+
+Column = Union[pd.Series, np.ndarray, List[Any]]
+
+def compact_records(columns: Dict[str, Column], decimals: int = 5) -> List[Dict[str, Any]]:
+    """
+    Builds the layer data for deck.gl as compact records.
+
+    Streamlit sends pydeck layers to the browser as JSON, so a DataFrame is serialized
+    with its full column names and float64 digits on every rerun. This function keeps
+    only the given columns under short keys, rounds floats (5 decimals is ~1 m) and
+    converts whole columns to Python values at once. A two dimensional array becomes
+    one list per record, e.g. an [n, 2] position array. The records are still one JSON
+    object per row, so callers keep the number of rows small (one per city, or a
+    bounded sample of points).
+
+    Args:
+        columns (Dict[str, Column]): Short key -> column, all of the same length
+        decimals (int): Decimals kept for floating point columns
+
+    Returns:
+        List[Dict[str, Any]]: One record per row, ready for pydeck.Layer(data=...)
+    """
+
+    keys: List[str] = list(columns)
+    values: List[List[Any]] = []
+
+    for key in keys:
+        column = columns[key]
+        array = column.to_numpy() if isinstance(column, pd.Series) else np.asarray(column)
+        if np.issubdtype(array.dtype, np.floating):
+            array = np.round(array.astype(np.float64), decimals)
+        values.append(array.tolist())
+
+    return [dict(zip(keys, row)) for row in zip(*values)]
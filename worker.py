@@ -0,0 +1,139 @@
+"""
+Copyright (c) 2024-2025, All rights reserved, Use subject to license terms.
+Scott Fehrman, scott.fehrman@sailpoint.com
+
+Background precompute worker. Keeps the identity snapshot fresh and, whenever the
+dataset version changes, builds the frame, aggregates, hierarchy, maps (including
+geocoding) and graph layouts in a process pool and publishes them to the artifact
+store. The Streamlit app then only loads and renders the published results.
+
+    python worker.py --interval 300 --processes 3
+"""
+
+import argparse
+import threading
+import time
+import utilities.constants as CONSTANTS
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import List
+from utilities.aggregates import IdentityCube
+from utilities.analytics import OrgAnalytics
+from utilities.artifacts import ArtifactStore
+from utilities.frames import get_identity_frame
+from utilities.graphs import get_reportsto, get_reportsto_deck
+from utilities.hierarchy import OrgHierarchy
+from utilities.maps import MAP_MODES, get_pydeck_map
+from utilities.snapshot import IdentitySnapshot
+from utilities.store import IdentityStore
+
+HEARTBEAT_INTERVAL: float = 30.0 # well below the app's WORKER_MAX_AGE
+
+def build_frames(tenant: str, db_file: str, root: str, staging: str) -> List[str]:
+    """Builds the identities, the frame, the count cube, the hierarchy, the analytics and the WebGL graph layout."""
+    artifacts = ArtifactStore(root)
+    identities = IdentitySnapshot(tenant, db_file).read()
+    df = get_identity_frame(identities)
+    hierarchy = OrgHierarchy.from_frame(df)
+    artifacts.write(staging, "identities", identities) # published with the frame, the normalized table pairs them by row
+    artifacts.write(staging, "frame", df)
+    artifacts.write(staging, "cube", IdentityCube(df, CONSTANTS.DEPARTMENT, CONSTANTS.LOCATION), CONSTANTS.DEPARTMENT, CONSTANTS.LOCATION)
+    artifacts.write(staging, "hierarchy", hierarchy)
+    artifacts.write(staging, "analytics", OrgAnalytics(df, hierarchy))
+    artifacts.write(staging, "graph_deck", get_reportsto_deck(df, hierarchy))
+    return ["identities", "frame", "cube", "hierarchy", "analytics", "graph_deck"]
+
+def build_maps(tenant: str, db_file: str, root: str, staging: str) -> List[str]:
+    """Builds the map in every mode, resolving the coordinates of new locations."""
+    artifacts = ArtifactStore(root)
+    store = IdentityStore.from_frame(get_identity_frame(IdentitySnapshot(tenant, db_file).read()))
+    for mode in MAP_MODES:
+        artifacts.write(staging, "map", get_pydeck_map(store, mode=mode), mode, None)
+    artifacts.write(staging, "map", get_pydeck_map(store, breakdown=CONSTANTS.DEPARTMENT, mode="columns"), "columns", CONSTANTS.DEPARTMENT)
+    return ["map"]
+
+def build_graph(tenant: str, db_file: str, root: str, staging: str, graph_limit: int) -> List[str]:
+    """Builds the identity store and, for tenants up to graph_limit identities, the interactive graph."""
+    artifacts = ArtifactStore(root)
+    store = IdentityStore.from_frame(get_identity_frame(IdentitySnapshot(tenant, db_file).read()))
+    artifacts.write(staging, "store", store)
+    if len(store) > graph_limit:
+        return ["store"]
+    artifacts.write(staging, "graph_html", get_reportsto(store).generate_html())
+    return ["store", "graph_html"]
+
+def precompute(snapshot: IdentitySnapshot, artifacts: ArtifactStore, pool: ProcessPoolExecutor, graph_limit: int) -> str:
+    """Builds and publishes every artifact of the current snapshot version, unless it is already published."""
+    version = snapshot.version()
+    if version == artifacts.current():
+        return version
+
+    start = time.perf_counter()
+    staging = artifacts.staging(version)
+    args = (snapshot.tenant, snapshot.db_file, artifacts.root, staging)
+    futures = [pool.submit(build_frames, *args), pool.submit(build_maps, *args), pool.submit(build_graph, *args, graph_limit)]
+    try:
+        stages = [stage for future in futures for stage in future.result()] # raises when a build failed, nothing is published
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        wait(futures) # the running builds still write into staging
+        artifacts.discard(staging)
+        raise
+    artifacts.publish(version, staging)
+    print(f"... Published version {version} ({', '.join(stages)}) in {time.perf_counter() - start:.1f}s ...")
+    return version
+
+def heartbeat(artifacts: ArtifactStore, interval: float, stop: threading.Event) -> None:
+    """Reports the worker alive every interval seconds, also while a long refresh or build runs."""
+    while not stop.is_set():
+        artifacts.heartbeat()
+        stop.wait(interval)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--interval", type=float, default=300.0, help="seconds between two snapshot refreshes")
+    parser.add_argument("--processes", type=int, default=3, help="processes building the artifacts")
+    parser.add_argument("--max-results", type=int, default=10000, help="maximum number of identities loaded")
+    parser.add_argument("--graph-limit", type=int, default=2000, help="largest tenant the interactive graph is prebuilt for")
+    parser.add_argument("--artifacts", default="artifacts", help="the artifact store directory")
+    parser.add_argument("--once", action="store_true", help="refresh and publish once, then exit")
+    args = parser.parse_args()
+
+    from utilities.sptk import sptk_service # the worker is the only process talking to the tenant
+    if sptk_service is None:
+        raise SystemExit("SailPoint configuration error, see config.json")
+
+    snapshot = IdentitySnapshot(tenant=str(getattr(sptk_service.config, "base_url", "default")), ttl=args.interval)
+    artifacts = ArtifactStore(args.artifacts)
+
+    stop = threading.Event()
+    threading.Thread(target=heartbeat, args=(artifacts, HEARTBEAT_INTERVAL, stop), daemon=True).start()
+    pool = ProcessPoolExecutor(max_workers=args.processes)
+    try:
+        while True:
+            try:
+                if artifacts.take_refresh_request(): # "Reload identities" in the app
+                    snapshot.invalidate()
+                if not snapshot.is_fresh():
+                    count = snapshot.refresh(sptk_service.get_identities_api().list_identities, search_api=sptk_service.get_search_api(), workers=8, max_results=args.max_results)
+                    print(f"... Refreshed snapshot, {count:,} identities fetched ...")
+                precompute(snapshot, artifacts, pool, args.graph_limit)
+            except Exception as e: # a transient API or build error, the published version stays current
+                print(f"... Error: precompute failed, retrying: {e} ...")
+                if isinstance(e, BrokenProcessPool): # a build process died, e.g. out of memory
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = ProcessPoolExecutor(max_workers=args.processes)
+                if args.once:
+                    raise SystemExit(1)
+            if args.once:
+                break
+            deadline = time.monotonic() + min(args.interval, 60.0)
+            while time.monotonic() < deadline and not artifacts.refresh_requested():
+                time.sleep(1.0)
+    finally:
+        stop.set()
+        pool.shutdown()
+
+if __name__ == "__main__":
+    main()